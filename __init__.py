@@ -1,38 +1,643 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, json, send_file, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
 from flask_cors import CORS
-from sklearn.cluster import KMeans
-import matplotlib.pyplot as plt
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import NullPool, QueuePool
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import wraps
+from urllib.parse import parse_qsl, urlencode
+import csv
+import hmac
+import io
+import multiprocessing
 import os
 import secrets
-import numpy as np
-import pandas as pd
-import math
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+# numpy is imported inside the analytics code paths (generate_bobot,
+# cluster), so workers that only serve CRUD and exam requests never load it
 
 # init app
 app = Flask(__name__)
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 # Database
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///db.sqlite3'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URI', 'sqlite:///db.sqlite3')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# SQLite engine profiles, selected with DB_PROFILE
+# production: WAL so readers never wait for the writer, NORMAL sync (safe
+#   with WAL), a busy timeout instead of instant 'database is locked', and
+#   a pool so the per-connection page cache and mmap survive requests
+# testing: throwaway databases, durability off
+# legacy: the old behaviour (rollback journal, new connection per request)
+sqlite_profiles = {
+    'production': {
+        'pragma': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 10000,
+                   'mmap_size': 268435456, 'cache_size': -16000, 'temp_store': 'MEMORY'},
+        'engine': {'poolclass': QueuePool, 'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 30,
+                   'connect_args': {'check_same_thread': False, 'timeout': 10}},
+    },
+    'testing': {
+        'pragma': {'journal_mode': 'MEMORY', 'synchronous': 'OFF', 'busy_timeout': 10000,
+                   'cache_size': -16000, 'temp_store': 'MEMORY'},
+        'engine': {'poolclass': QueuePool, 'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 30,
+                   'connect_args': {'check_same_thread': False, 'timeout': 10}},
+    },
+    'legacy': {
+        'pragma': {},
+        'engine': {'poolclass': NullPool},
+    },
+}
+
+app.config['DB_PROFILE'] = os.environ.get('DB_PROFILE', 'production')
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_profiles[app.config['DB_PROFILE']]['engine']
+
+# Pagination
+app.config['PAGE_LIMIT'] = 100
+app.config['PAGE_LIMIT_MAX'] = 500
+
+# Rows per chunk for streamed exports
+app.config['EXPORT_CHUNK_SIZE'] = 500
+
+# Exam content cache (number of entries)
+app.config['SOAL_CACHE_SIZE'] = 2048
+app.config['BANK_SOAL_CACHE_SIZE'] = 64
+
+# Seconds between checks of the shared cache version
+app.config['CACHE_VERSION_INTERVAL'] = 1.0
+
+# Processes per web worker for background jobs
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+
+# Seconds without progress after which a waiting or running job is failed
+app.config['JOB_TIMEOUT'] = float(os.environ.get('JOB_TIMEOUT', 30 * 60))
+
+# Request metrics: per-worker snapshots are merged by GET /metrics, so every
+# worker of one deployment must share METRICS_DIR
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'apievluasi-metrics'))
+app.config['METRICS_FLUSH_INTERVAL'] = 5.0
+app.config['METRICS_BUCKETS'] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Exam token cache and signed exam tickets. SECRET_KEY defaults to the key
+# generated by migration 0005, so every worker signs with the same key.
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+app.config['TOKEN_CACHE_TTL'] = 30.0
+app.config['TIKET_MAX_AGE'] = 2 * 60 * 60
+app.config['TIKET_REQUIRED'] = os.environ.get('TIKET_REQUIRED', '0') == '1'
+
+# On-demand profiling, off unless PROFILE_TOKEN is set
+app.config['PROFILE_TOKEN'] = os.environ.get('PROFILE_TOKEN')
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'apievluasi-profiles'))
+app.config['PROFILE_KEEP'] = 50
+
+# Response matrices for analytics; defaults to a '-matrix' directory next
+# to the SQLite file
+app.config['MATRIX_DIR'] = os.environ.get('MATRIX_DIR')
+
 # Init db
 db = SQLAlchemy(app)
 
+
+# Apply the profile PRAGMAs to every new SQLite connection
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+
+    for nama, value in sqlite_profiles[app.config['DB_PROFILE']]['pragma'].items():
+        cursor.execute('PRAGMA %s = %s' % (nama, value))
+
+    cursor.close()
+
 # Init ma
 ma = Marshmallow(app)
 
 # Init cors
-CORS(app)
+CORS(app, expose_headers=['X-Next-After-Id'])
+
+
+# Keyset pagination for list endpoints: ?after_id=&limit=&fields=
+# Only the requested columns are selected; the cursor for the next page
+# is sent in the X-Next-After-Id header. Without after_id or limit the
+# whole list is returned, as before pagination existed.
+def get_page(model, schema):
+    after_id = request.args.get('after_id', 0, type=int)
+    limit = None
+
+    if 'after_id' in request.args or 'limit' in request.args:
+        limit = request.args.get('limit', app.config['PAGE_LIMIT'], type=int)
+        limit = max(1, min(limit, app.config['PAGE_LIMIT_MAX']))
+
+    fields = [f for f in request.args.get('fields', '').split(',') if f in schema.Meta.fields]
+    fields = fields or list(schema.Meta.fields)
+    columns = [f for f in fields if f in model.__table__.columns]
+
+    rows = db.session.query(model.id, *[getattr(model, f) for f in columns]).filter(
+        model.id > after_id).order_by(model.id)
+
+    if limit is None:
+        rows = rows.all()
+        next_id = None
+    else:
+        rows = rows.limit(limit + 1).all()
+        next_id = rows[limit - 1][0] if len(rows) > limit else None
+        rows = rows[:limit]
+
+    ids = [row[0] for row in rows]
+    page = [dict(zip(columns, row[1:])) for row in rows]
+
+    return ids, page, fields, next_id
+
+
+def page_response(page, next_id):
+    response = jsonify(page)
+
+    if next_id is not None:
+        response.headers['X-Next-After-Id'] = str(next_id)
+
+    return response
+
+
+# Response from already serialized JSON bytes
+def json_response(payload):
+    return app.response_class(payload, mimetype='application/json')
+
+
+# int of an id or status sent as a number or a numeric string, None otherwise
+def ke_int(value):
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        return None
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Whether a process on this host is still running
+def proses_hidup(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+# Request metrics
+# Every worker keeps per-endpoint counters in memory and writes a snapshot
+# to METRICS_DIR/<master pid>/<pid>-<token>.json at most every
+# METRICS_FLUSH_INTERVAL seconds; GET /metrics merges the snapshots of all
+# workers of the running deployment. The token keeps a reused pid from
+# overwriting the snapshot of an earlier worker. SQL statements are
+# counted with cursor events on the requesting thread.
+metrics = {}
+metrics_lock = threading.Lock()
+metrics_flush = {'token': secrets.token_hex(4), 'flushed': 0}
+request_sql = threading.local()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(request_sql, 'active', False):
+        request_sql.start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(request_sql, 'active', False):
+        waktu = time.perf_counter() - request_sql.start
+        request_sql.count += 1
+        request_sql.seconds += waktu
+
+        if getattr(request_sql, 'statements', None) is not None:
+            request_sql.statements.append({'statement': statement, 'executemany': executemany, 'seconds': waktu})
+
+
+@app.before_request
+def start_metrics():
+    request_sql.active = True
+    request_sql.count = 0
+    request_sql.seconds = 0.0
+    request_sql.begin = time.perf_counter()
+
+
+@app.after_request
+def record_metrics(response):
+    if not getattr(request_sql, 'active', False):
+        return response
+
+    waktu = time.perf_counter() - request_sql.begin
+    request_sql.active = False
+    buckets = app.config['METRICS_BUCKETS']
+
+    with metrics_lock:
+        item = metrics.get(request.endpoint or 'unknown')
+
+        if item is None:
+            item = metrics[request.endpoint or 'unknown'] = {
+                'status': {}, 'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0,
+                'sql_count': 0, 'sql_seconds': 0.0}
+
+        status = str(response.status_code)
+        item['status'][status] = item['status'].get(status, 0) + 1
+        item['count'] += 1
+        item['sum'] += waktu
+        item['sql_count'] += request_sql.count
+        item['sql_seconds'] += request_sql.seconds
+
+        for i, batas in enumerate(buckets):
+            if waktu <= batas:
+                item['buckets'][i] += 1
+                break
+
+    if time.monotonic() - metrics_flush['flushed'] >= app.config['METRICS_FLUSH_INTERVAL']:
+        flush_metrics()
+
+    return response
+
+
+def flush_metrics():
+    metrics_flush['flushed'] = time.monotonic()
+
+    with metrics_lock:
+        snapshot = json.dumps(metrics)
+
+    try:
+        directory = get_metrics_dir()
+        os.makedirs(directory, exist_ok=True)
+        tulis_metrics(os.path.join(directory, '%d-%s.json' % (os.getpid(), metrics_flush['token'])), snapshot)
+    except OSError as e:
+        app.logger.warning('Cannot write metrics: %s', e)
+
+
+# Snapshots of one deployment (one gunicorn master) share a directory
+def get_metrics_dir():
+    return os.path.join(app.config['METRICS_DIR'], str(os.getppid()))
+
+
+# Every writer gets its own temp file, so a partial file is never renamed
+def tulis_metrics(path, snapshot):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(snapshot)
+
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def baca_metrics(path):
+    try:
+        with open(path) as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return {}
+
+
+def tambah_metrics(merged, snapshot):
+    for endpoint, item in snapshot.items():
+        total = merged.setdefault(endpoint, {
+            'status': {}, 'buckets': [0] * len(item['buckets']), 'sum': 0.0, 'count': 0,
+            'sql_count': 0, 'sql_seconds': 0.0})
+
+        for status, count in item['status'].items():
+            total['status'][status] = total['status'].get(status, 0) + count
+
+        total['buckets'] = [a + b for a, b in zip(total['buckets'], item['buckets'])]
+
+        for key in ('sum', 'count', 'sql_count', 'sql_seconds'):
+            total[key] += item[key]
+
+    return merged
+
+
+# Drop the directories (and old-style files) of deployments whose master
+# is gone, and fold the snapshots of dead workers of this deployment into
+# gabungan.json, so the counters of a recycled worker are kept once
+def prune_metrics():
+    base = app.config['METRICS_DIR']
+
+    try:
+        names = os.listdir(base)
+    except OSError:
+        return
+
+    for nama in names:
+        pid = nama.split('.')[0]
+
+        if pid.isdigit() and int(pid) != os.getppid() and not proses_hidup(int(pid)):
+            path = os.path.join(base, nama)
+
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    try:
+        import fcntl
+    except ImportError:
+        return
+
+    directory = get_metrics_dir()
+
+    if not os.path.isdir(directory):
+        return
+
+    with open(os.path.join(directory, 'gabungan.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        mati = [nama for nama in os.listdir(directory) if nama.endswith('.json') and nama.split('-')[0].isdigit()
+                and not proses_hidup(int(nama.split('-')[0]))]
+
+        if not mati:
+            return
+
+        gabungan = os.path.join(directory, 'gabungan.json')
+        total = baca_metrics(gabungan)
+
+        for nama in mati:
+            tambah_metrics(total, baca_metrics(os.path.join(directory, nama)))
+
+        tulis_metrics(gabungan, json.dumps(total))
+
+        for nama in mati:
+            os.unlink(os.path.join(directory, nama))
+
+
+def merge_metrics():
+    prune_metrics()
+    directory = get_metrics_dir()
+    merged = {}
+
+    for nama in sorted(os.listdir(directory)):
+        if nama.endswith('.json'):
+            tambah_metrics(merged, baca_metrics(os.path.join(directory, nama)))
+
+    return merged
+
+
+# Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    flush_metrics()
+    merged = merge_metrics()
+    buckets = app.config['METRICS_BUCKETS']
+    lines = []
+
+    lines.append('# HELP http_request_duration_seconds Request latency by Flask endpoint.')
+    lines.append('# TYPE http_request_duration_seconds histogram')
+    for endpoint, item in sorted(merged.items()):
+        kumulatif = 0
+        for batas, count in zip(buckets, item['buckets']):
+            kumulatif += count
+            lines.append('http_request_duration_seconds_bucket{endpoint="%s",le="%s"} %d' % (endpoint, batas, kumulatif))
+        lines.append('http_request_duration_seconds_bucket{endpoint="%s",le="+Inf"} %d' % (endpoint, item['count']))
+        lines.append('http_request_duration_seconds_sum{endpoint="%s"} %r' % (endpoint, item['sum']))
+        lines.append('http_request_duration_seconds_count{endpoint="%s"} %d' % (endpoint, item['count']))
+
+    lines.append('# HELP http_requests_total Requests by Flask endpoint and status code.')
+    lines.append('# TYPE http_requests_total counter')
+    for endpoint, item in sorted(merged.items()):
+        for status, count in sorted(item['status'].items()):
+            lines.append('http_requests_total{endpoint="%s",status="%s"} %d' % (endpoint, status, count))
+
+    lines.append('# HELP db_statements_total SQL statements executed by Flask endpoint.')
+    lines.append('# TYPE db_statements_total counter')
+    for endpoint, item in sorted(merged.items()):
+        lines.append('db_statements_total{endpoint="%s"} %d' % (endpoint, item['sql_count']))
+
+    lines.append('# HELP db_statement_duration_seconds_total Time spent in SQL statements by Flask endpoint.')
+    lines.append('# TYPE db_statement_duration_seconds_total counter')
+    for endpoint, item in sorted(merged.items()):
+        lines.append('db_statement_duration_seconds_total{endpoint="%s"} %r' % (endpoint, item['sql_seconds']))
+
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+# Request profiler
+# A request carrying the PROFILE_TOKEN in the X-Profile header or the
+# ?profile= parameter runs under cProfile; its stats and SQL statements
+# (without parameters) are saved to PROFILE_DIR, keeping the newest
+# PROFILE_KEEP. Other requests only pay for one header/query lookup.
+# /debug/profiles itself is never profiled: it carries the same token, and
+# its own profiles would push the real ones out of the rotation.
+def profile_requested(environ):
+    token = app.config['PROFILE_TOKEN']
+
+    if not token or environ.get('PATH_INFO', '').startswith('/debug/profiles'):
+        return False
+
+    value = environ.get('HTTP_X_PROFILE')
+
+    if value is None and 'profile=' in environ.get('QUERY_STRING', ''):
+        value = dict(parse_qsl(environ['QUERY_STRING'])).get('profile', '')
+
+    return value is not None and hmac.compare_digest(value.encode(), token.encode())
+
+
+class RequestProfiler:
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if not profile_requested(environ):
+            return self.wsgi_app(environ, start_response)
+
+        import cProfile
+
+        status = []
+
+        def catch_start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split(' ', 1)[0]))
+            return start_response(status_line, headers, exc_info)
+
+        request_sql.statements = []
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+
+        try:
+            response = self.wsgi_app(environ, catch_start_response)
+
+            try:
+                body = list(response)
+            finally:
+                if hasattr(response, 'close'):
+                    response.close()
+        finally:
+            profiler.disable()
+            waktu = time.perf_counter() - start
+            statements = request_sql.statements
+            request_sql.statements = None
+
+            save_profile(profiler, statements, {
+                'method': environ.get('REQUEST_METHOD'),
+                'path': environ.get('PATH_INFO'),
+                'query': urlencode([(k, v) for k, v in parse_qsl(environ.get('QUERY_STRING', ''), keep_blank_values=True)
+                                    if k != 'profile']),
+                'status': status[0] if status else 500,
+                'seconds': waktu,
+            })
+
+        return body
+
+
+def save_profile(profiler, statements, info):
+    directory = app.config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+
+    nama = '%s-%06d-%d' % (time.strftime('%Y%m%d-%H%M%S'), int(time.time() % 1 * 1e6), os.getpid())
+    info.update({'nama': nama, 'dibuat': time.time(), 'sql_count': len(statements),
+                 'sql_seconds': sum(item['seconds'] for item in statements)})
+
+    profiler.dump_stats(os.path.join(directory, nama + '.prof'))
+
+    with open(os.path.join(directory, nama + '.json'), 'w') as f:
+        f.write(json.dumps(dict(info, statements=statements)))
+
+    # Rotate: drop the oldest profiles beyond PROFILE_KEEP
+    profiles = sorted(n[:-5] for n in os.listdir(directory) if n.endswith('.json'))
+
+    for lama in profiles[:-app.config['PROFILE_KEEP']]:
+        for ext in ('.prof', '.json'):
+            try:
+                os.remove(os.path.join(directory, lama + ext))
+            except OSError:
+                pass
+
+
+app.wsgi_app = RequestProfiler(app.wsgi_app)
+
+
+def profile_authorized():
+    token = app.config['PROFILE_TOKEN']
+    value = request.headers.get('X-Profile', request.args.get('profile', ''))
+
+    return bool(token) and hmac.compare_digest(value.encode(), token.encode())
+
+
+# List saved profiles, newest first
+@app.route('/debug/profiles', methods=['GET'])
+def get_profiles():
+    if not profile_authorized():
+        return jsonify({'message': 'forbidden'}), 403
+
+    directory = app.config['PROFILE_DIR']
+    result = []
+
+    if os.path.isdir(directory):
+        for nama in sorted((n for n in os.listdir(directory) if n.endswith('.json')), reverse=True):
+            try:
+                with open(os.path.join(directory, nama)) as f:
+                    info = json.loads(f.read())
+            except (OSError, ValueError):
+                continue
+
+            info.pop('statements', None)
+            info['stats'] = '/debug/profiles/%s' % info['nama']
+            info['sql'] = '/debug/profiles/%s/sql' % info['nama']
+            result.append(info)
+
+    return jsonify(result)
+
+# Download cProfile stats (open with pstats or snakeviz)
+@app.route('/debug/profiles/<nama>', methods=['GET'])
+def get_profile_stats(nama):
+    if not profile_authorized():
+        return jsonify({'message': 'forbidden'}), 403
+
+    path = os.path.join(app.config['PROFILE_DIR'], os.path.basename(nama) + '.prof')
+
+    if not os.path.isfile(path):
+        return jsonify({'message': 'profile not found'}), 404
+
+    return send_file(path, as_attachment=True)
+
+# SQL statements and timings of a profile
+@app.route('/debug/profiles/<nama>/sql', methods=['GET'])
+def get_profile_sql(nama):
+    if not profile_authorized():
+        return jsonify({'message': 'forbidden'}), 403
+
+    path = os.path.join(app.config['PROFILE_DIR'], os.path.basename(nama) + '.json')
+
+    if not os.path.isfile(path):
+        return jsonify({'message': 'profile not found'}), 404
+
+    with open(path) as f:
+        return json_response(f.read())
+
+
+# Thread-safe LRU cache with hit/miss counters
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.data:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def pop_where(self, predicate):
+        with self.lock:
+            for key in [key for key in self.data if predicate(key)]:
+                del self.data[key]
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def stats(self):
+        return {'size': len(self.data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
 
 
 # Siswa Model
 class Siswa(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    id_kelas = db.Column(db.Integer)
-    nis = db.Column(db.String(100))
+    id_kelas = db.Column(db.Integer, index=True)
+    nis = db.Column(db.String(100), index=True)
     nama = db.Column(db.String(100))
     jenis_kelamin = db.Column(db.String(100))
     password = db.Column(db.String(100))
@@ -61,10 +666,9 @@ siswas_schema = SiswaSchema(many=True)
 # Get All Siswa
 @app.route('/siswa', methods=['GET'])
 def get_all_siswa():
-    all_siswa = Siswa.query.all()
-    result = siswas_schema.dump(all_siswa)
+    ids, result, fields, next_id = get_page(Siswa, siswas_schema)
 
-    return jsonify(result)
+    return page_response(result, next_id)
 
 # Auth Siswa
 @app.route('/auth/siswa', methods=['POST'])
@@ -351,10 +955,18 @@ many_custom_test_schema = TestSchemaCustom(many=True)
 # Get All Test with Jawaban
 @app.route('/alltest', methods=['GET'])
 def get_all_test_with_option():
-    all_test = Test.query.all()
-    result = many_custom_test_schema.dump(all_test)
+    ids, result, fields, next_id = get_page(Test, many_custom_test_schema)
 
-    return jsonify(result)
+    if 'pilihan' in fields and ids:
+        pilihan = {id: [] for id in ids}
+
+        for row in PilihanTest.query.filter(PilihanTest.id_test.in_(ids)).order_by(PilihanTest.id):
+            pilihan[row.id_test].append(row)
+
+        for id, test in zip(ids, result):
+            test['pilihan'] = many_pilihan_test_schema.dump(pilihan[id])
+
+    return page_response(result, next_id)
 
 # Get All Test
 @app.route('/test', methods=['GET'])
@@ -399,7 +1011,7 @@ def update_test(id):
 # Model Pilihan Test
 class PilihanTest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    id_test = db.Column(db.Integer, db.ForeignKey('test.id'), nullable=False)
+    id_test = db.Column(db.Integer, db.ForeignKey('test.id'), nullable=False, index=True)
     pilihan = db.Column(db.String(100))
     is_right = db.Column(db.Integer)
 
@@ -416,10 +1028,9 @@ many_pilihan_test_schema = PilihanTestSchema(many=True)
 # Get All Pilihan Test
 @app.route('/pilihantest', methods=['GET'])
 def get_all_pilihan_test():
-    all_pilihan_test = PilihanTest.query.all()
-    result = many_pilihan_test_schema.dump(all_pilihan_test)
+    ids, result, fields, next_id = get_page(PilihanTest, many_pilihan_test_schema)
 
-    return jsonify(result)
+    return page_response(result, next_id)
 
 # Get All Kelas By id_test
 @app.route('/pilihantest/<id_test>', methods=['GET'])
@@ -491,28 +1102,162 @@ def get_a_token(id):
 
     return token_schema.jsonify(token)
 
+# Token cache for the exam start burst: id -> (token, expires). An entry
+# lives TOKEN_CACHE_TTL seconds, is replaced by update_token and dropped in
+# other workers through the shared cache version.
+cache_token = {}
+cache_token_lock = threading.Lock()
+
+
+def get_token_value(id, refresh=False):
+    now = time.monotonic()
+
+    with cache_token_lock:
+        entry = cache_token.get(id)
+
+    if entry is not None and entry[1] > now and not refresh:
+        return entry[0]
+
+    token = db.session.query(Token.token).filter_by(id=id).scalar()
+    set_token_value(id, token)
+
+    return token
+
+
+def set_token_value(id, token):
+    with cache_token_lock:
+        cache_token[id] = (token, time.monotonic() + app.config['TOKEN_CACHE_TTL'])
+
+
+def drop_token_value(id):
+    with cache_token_lock:
+        cache_token.pop(id, None)
+
+
+def cocok(value, token):
+    return token is not None and hmac.compare_digest(str(value).encode(), token.encode())
+
+
+# Signed exam tickets
+def get_secret_key():
+    if app.config['SECRET_KEY'] is None:
+        app.config['SECRET_KEY'] = db.session.execute(
+            "SELECT nilai FROM pengaturan WHERE nama = 'secret_key'").scalar()
+
+    return app.config['SECRET_KEY']
+
+
+def tiket_serializer():
+    return URLSafeTimedSerializer(get_secret_key(), salt='tiket-ujian')
+
+
+def buat_tiket(payload):
+    return tiket_serializer().dumps(payload)
+
+
+# Payload of the X-Tiket-Ujian header, or None when it is missing, forged
+# or older than TIKET_MAX_AGE
+def baca_tiket():
+    tiket = request.headers.get('X-Tiket-Ujian')
+
+    if not tiket:
+        return None
+
+    try:
+        return tiket_serializer().loads(tiket, max_age=app.config['TIKET_MAX_AGE'])
+    except BadSignature:
+        return None
+
+
+# Ids a ticket is bound to; tickets without id_siswa or id_ujian (issued
+# before they were bound) are not valid
+kunci_tiket = ('id_siswa', 'id_ujian', 'id_kelas', 'id_bank_soal')
+
+
+# Exam routes check the ticket without touching Siswa or Token; with
+# TIKET_REQUIRED off, requests without a valid ticket still pass. A request
+# with a ticket is refused when an id in its URL or JSON body is not the one
+# the ticket was issued for.
+def tiket_required(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        g.tiket = baca_tiket()
+
+        if g.tiket is not None and (g.tiket.get('id_siswa') is None or g.tiket.get('id_ujian') is None):
+            g.tiket = None
+
+        if g.tiket is None:
+            if app.config['TIKET_REQUIRED']:
+                return jsonify({'message': 'tiket ujian tidak valid'}), 401
+
+            return f(*args, **kwargs)
+
+        body = request.get_json(silent=True)
+        body = body if isinstance(body, dict) else {}
+
+        for kunci in kunci_tiket:
+            for nilai in (kwargs.get(kunci), body.get(kunci)):
+                if nilai is not None and ke_int(nilai) != g.tiket.get(kunci):
+                    return jsonify({'message': 'tiket ujian bukan untuk %s ini' % kunci}), 403
+
+        return f(*args, **kwargs)
+
+    return wrapper
+
 # Update Token
 @app.route('/token/<id>', methods=['PUT'])
 def update_token(id):
     token = Token.query.get(id)
     token.token = secrets.token_hex(3)
 
+    invalidate('token:%d' % token.id)
     db.session.commit()
+    set_token_value(token.id, token.token)
 
     return token_schema.jsonify(token)
 
 # Auth Token
+# Body: {"token", "nis", "password", "id_ujian"}. A match returns the token;
+# when nis and password belong to a siswa of the kelas of that ujian, it
+# also returns a signed exam ticket for the X-Tiket-Ujian header, bound to
+# that siswa, ujian, kelas and bank soal.
 @app.route('/token/<id>', methods=['POST'])
 def auth_token(id):
     temp = request.json['token']
-    token = Token.query.filter_by(id=id, token=temp).first()
-    result = token_schema.dump(token)
+    id = ke_int(id)
 
-    return jsonify(result)
+    # No token has a non-numeric id; answered like a wrong token
+    if id is None:
+        return jsonify({})
+
+    # A miss is checked once more against the database, so a token that
+    # was just changed in another worker is never refused
+    if not cocok(temp, get_token_value(id)) and not cocok(temp, get_token_value(id, refresh=True)):
+        return jsonify({})
+
+    if 'nis' not in request.json or 'id_ujian' not in request.json:
+        return jsonify({'id': id, 'token': temp})
+
+    siswa = Siswa.query.filter_by(nis=request.json['nis'], password=request.json.get('password')).first()
+    id_ujian = ke_int(request.json['id_ujian'])
+    ujian = Ujian.query.get(id_ujian) if id_ujian is not None else None
+
+    if siswa is None:
+        return jsonify({'message': 'nis atau password salah'}), 401
+
+    if ujian is None or ujian.id_kelas != siswa.id_kelas:
+        return jsonify({'message': 'ujian bukan untuk kelas siswa'}), 403
+
+    tiket = buat_tiket({'id_token': id, 'id_siswa': siswa.id, 'id_ujian': ujian.id,
+                        'id_kelas': ujian.id_kelas, 'id_bank_soal': ujian.id_bank_soal})
+
+    return jsonify({'id': id, 'token': temp, 'tiket': tiket})
 
 
 # Model Ujian
 class Ujian(db.Model):
+    __table_args__ = (db.Index('ix_ujian_id_kelas_status_tanggal_tes', 'id_kelas', 'status', 'tanggal_tes'),)
+
     id = db.Column(db.Integer, primary_key=True)
     id_kelas = db.Column(db.Integer)
     id_bank_soal = db.Column(db.Integer)
@@ -543,15 +1288,14 @@ many_ujian_schema = UjianSchema(many=True)
 # Get All Ujian
 @app.route('/ujian', methods=['GET'])
 def get_ujian():
-    all_ujian = Ujian.query.all()
-    result = many_ujian_schema.dump(all_ujian)
+    ids, result, fields, next_id = get_page(Ujian, many_ujian_schema)
 
-    return jsonify(result)
+    return page_response(result, next_id)
 
 # Get Active Ujian
 @app.route('/ujian/active/<id_kelas>', methods=['GET'])
 def get_active_ujian(id_kelas):
-    ujian = Ujian.query.filter_by(id_kelas=id_kelas, status=1).first()
+    ujian = Ujian.query.filter_by(id_kelas=id_kelas, status=1).order_by(Ujian.id).first()
 
     return ujian_schema.jsonify(ujian)
 
@@ -565,7 +1309,7 @@ def get_one_ujian(id):
 # Get ujian by id_kelas
 @app.route('/ujian/kelas/<id_kelas>', methods=['GET'])
 def get_ujian_by_kelas(id_kelas):
-    ujian = Ujian.query.filter_by(id_kelas=id_kelas)
+    ujian = Ujian.query.filter_by(id_kelas=id_kelas).order_by(Ujian.id)
     result = many_ujian_schema.dump(ujian)
 
     return jsonify(result)
@@ -689,7 +1433,7 @@ def update_bank_soal(id):
 # Model Soal
 class Soal(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    id_bank_soal = db.Column(db.Integer)
+    id_bank_soal = db.Column(db.Integer, index=True)
     pertanyaan = db.Column(db.String(500))
     pilihan = db.relationship('PilihanSoal', backref='soal', lazy=True)
 
@@ -721,13 +1465,75 @@ custom_soal_schema = SoalSchemaCustom()
 many_custom_soal_schema = SoalSchemaCustom(many=True)
 
 
+# Get a Soal with its Pilihan in two queries
+def load_soal(id_soal):
+    return Soal.query.options(db.selectinload(Soal.pilihan)).get(id_soal)
+
+
+# Serialized Soal + Pilihan, keyed by (id_bank_soal, id_soal) and by id_bank_soal
+cache_soal = LRUCache(app.config['SOAL_CACHE_SIZE'])
+cache_bank_soal = LRUCache(app.config['BANK_SOAL_CACHE_SIZE'])
+
+
+# No Soal has a non-numeric id, so those get the empty payloads without
+# touching the database or the caches
+def get_soal_payload(id_bank_soal, id_soal):
+    key = (ke_int(id_bank_soal), ke_int(id_soal))
+
+    if None in key:
+        return b'{}'
+
+    payload = cache_soal.get(key)
+
+    if payload is None:
+        payload = json.dumps(custom_soal_schema.dump(load_soal(id_soal))).encode('utf-8')
+        cache_soal.set(key, payload)
+
+    return payload
+
+
+def get_bank_soal_payload(id_bank_soal):
+    key = ke_int(id_bank_soal)
+
+    if key is None:
+        return b'[]'
+
+    payload = cache_bank_soal.get(key)
+
+    if payload is None:
+        all_soal = Soal.query.options(db.selectinload(Soal.pilihan)).filter_by(id_bank_soal=id_bank_soal)
+        payload = json.dumps(many_custom_soal_schema.dump(all_soal)).encode('utf-8')
+        cache_bank_soal.set(key, payload)
+
+    return payload
+
+
+# Call these before the commit of a write: the version bump is part of the
+# same transaction, so other workers see it together with the change
+def invalidate_soal(id_soal, *id_bank_soal):
+    invalidate('soal:%d' % int(id_soal), *['bank_soal:%d' % int(bank) for bank in id_bank_soal if bank is not None])
+
+
+def invalidate_bank_soal(*id_bank_soal):
+    invalidate(*['bank_soal:%d' % int(bank) for bank in id_bank_soal])
+
+
+# Pilihan changed: invalidate its Soal and the bank of that Soal
+def invalidate_pilihan_soal(*id_soal):
+    for id in set(int(i) for i in id_soal):
+        invalidate_soal(id, *[bank for (bank,) in db.session.query(Soal.id_bank_soal).filter_by(id=id)])
+
+
+# Get Cache Stats
+@app.route('/cache', methods=['GET'])
+def get_cache_stats():
+    return jsonify({'soal': cache_soal.stats(), 'bank_soal': cache_bank_soal.stats()})
+
+
 # Get All Soal by id_bank_soal with Pilihan
 @app.route('/soal/bank-soal/<id_bank_soal>', methods=['GET'])
 def get_soal_by_bank_pilihan(id_bank_soal):
-    all_soal = Soal.query.filter_by(id_bank_soal=id_bank_soal)
-    result = many_custom_soal_schema.dump(all_soal)
-
-    return jsonify(result)
+    return json_response(get_bank_soal_payload(id_bank_soal))
 
 # Get All Soal by id_bank_soal
 @app.route('/soal/<id_bank_soal>', methods=['GET'])
@@ -745,6 +1551,7 @@ def add_soal():
 
     new_soal = Soal(id_bank_soal=id_bank_soal, pertanyaan=pertanyaan)
     db.session.add(new_soal)
+    invalidate_bank_soal(id_bank_soal)
     db.session.commit()
 
     return soal_schema.jsonify(new_soal)
@@ -754,6 +1561,7 @@ def add_soal():
 def delete_soal(id):
     soal = Soal.query.get(id)
     db.session.delete(soal)
+    invalidate_soal(soal.id, soal.id_bank_soal)
     db.session.commit()
 
     return soal_schema.jsonify(soal)
@@ -762,10 +1570,12 @@ def delete_soal(id):
 @app.route('/soal/<id>', methods=['PUT'])
 def update_soal(id):
     soal = Soal.query.get(id)
+    id_bank_soal_lama = soal.id_bank_soal
 
     soal.id_bank_soal = request.json['id_bank_soal']
     soal.pertanyaan = request.json['pertanyaan']
 
+    invalidate_soal(id, id_bank_soal_lama, request.json['id_bank_soal'])
     db.session.commit()
 
     return soal_schema.jsonify(soal)
@@ -779,6 +1589,7 @@ def upload_batch_soal(id):
         new_soal = Soal(id_bank_soal=id, pertanyaan=i['pertanyaan'])
         db.session.add(new_soal)
 
+    invalidate_bank_soal(id)
     db.session.commit()
 
     all_soal = Soal.query.filter_by(id_bank_soal=id)
@@ -790,7 +1601,7 @@ def upload_batch_soal(id):
 # Model Pilihan Soal
 class PilihanSoal(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    id_soal = db.Column(db.Integer, db.ForeignKey('soal.id'), nullable=False)
+    id_soal = db.Column(db.Integer, db.ForeignKey('soal.id'), nullable=False, index=True)
     pilihan = db.Column(db.String(100))
     is_right = db.Column(db.Integer)
     analisis = db.Column(db.String(100))
@@ -811,10 +1622,9 @@ many_pilihan_soal_schema = PilihanSoalSchema(many=True)
 # Get All Pilihan Soal
 @app.route('/pilihan-soal', methods=['GET'])
 def get_all_pilihan_soal():
-    all_pilihan_soal = PilihanSoal.query.all()
-    result = many_pilihan_soal_schema.dump(all_pilihan_soal)
+    ids, result, fields, next_id = get_page(PilihanSoal, many_pilihan_soal_schema)
 
-    return jsonify(result)
+    return page_response(result, next_id)
 
 # Get All Pilihan Soal by id_soal
 @app.route('/pilihan-soal/<id_soal>', methods=['GET'])
@@ -835,6 +1645,7 @@ def add_pilihan_soal():
 
     new_pilihan_soal = PilihanSoal(id_soal, pilihan, is_right, analisis, keterangan)
     db.session.add(new_pilihan_soal)
+    invalidate_pilihan_soal(id_soal)
     db.session.commit()
 
     return pilihan_soal_schema.jsonify(new_pilihan_soal)
@@ -844,6 +1655,7 @@ def add_pilihan_soal():
 def delete_pilihan_soal(id):
     pilihan_soal = PilihanSoal.query.get(id)
     db.session.delete(pilihan_soal)
+    invalidate_pilihan_soal(pilihan_soal.id_soal)
     db.session.commit()
 
     return pilihan_soal_schema.jsonify(pilihan_soal)
@@ -852,6 +1664,7 @@ def delete_pilihan_soal(id):
 @app.route('/pilihan-soal/<id>', methods=['PUT'])
 def edit_pilihan_soal(id):
     pilihan_soal = PilihanSoal.query.get(id)
+    id_soal_lama = pilihan_soal.id_soal
 
     pilihan_soal.id_soal = request.json['id_soal']
     pilihan_soal.pilihan = request.json['pilihan']
@@ -859,6 +1672,7 @@ def edit_pilihan_soal(id):
     pilihan_soal.analisis = request.json['analisis']
     pilihan_soal.keterangan = request.json['keterangan']
 
+    invalidate_pilihan_soal(id_soal_lama, request.json['id_soal'])
     db.session.commit()
 
     return pilihan_soal_schema.jsonify(pilihan_soal)
@@ -872,6 +1686,7 @@ def upload_batch_pilihan_soal(id):
         new_pilihan_soal = PilihanSoal(id, i['pilihan'], i['is_right'], i['analisis'], i['keterangan'])
         db.session.add(new_pilihan_soal)
 
+    invalidate_pilihan_soal(id)
     db.session.commit()
 
     all_pilihan_soal = PilihanSoal.query.filter_by(id_soal=id)
@@ -882,9 +1697,11 @@ def upload_batch_pilihan_soal(id):
 
 # Model Jawaban
 class Jawaban(db.Model):
+    __table_args__ = (db.Index('ix_jawaban_id_siswa_id_ujian', 'id_siswa', 'id_ujian'),)
+
     id = db.Column(db.Integer, primary_key=True)
     id_siswa = db.Column(db.Integer)
-    id_ujian = db.Column(db.Integer)
+    id_ujian = db.Column(db.Integer, index=True)
     id_soal = db.Column(db.Integer)
     jawaban = db.Column(db.String(100))
     kunci = db.Column(db.String(100))
@@ -919,10 +1736,9 @@ many_jawaban_schema = JawabanSchema(many=True)
 # Get All Jawaban
 @app.route('/jawaban', methods=['GET'])
 def get_jawaban():
-    all_jawaban = Jawaban.query.all()
-    result = many_jawaban_schema.dump(all_jawaban)
+    ids, result, fields, next_id = get_page(Jawaban, many_jawaban_schema)
 
-    return jsonify(result)
+    return page_response(result, next_id)
 
 # Get All Jawaban Siswa
 @app.route('/jawaban/siswa/<id_siswa>/<id_ujian>', methods=['GET'])
@@ -934,6 +1750,7 @@ def get_jawaban_siswa(id_siswa, id_ujian):
 
 # Add Jawaban
 @app.route('/jawaban', methods=['POST'])
+@tiket_required
 def add_jawaban():
     id_siswa = request.json['id_siswa']
     id_ujian = request.json['id_ujian']
@@ -951,6 +1768,48 @@ def add_jawaban():
 
     return jawaban_schema.jsonify(new_jawaban)
 
+# Answer fields stored as sent
+kolom_jawaban_teks = ('jawaban', 'kunci', 'analisis', 'keterangan', 'pertanyaan')
+pesan_jawaban_invalid = 'jawaban needs %s and integer id_soal and status' % ', '.join(kolom_jawaban_teks)
+
+
+# Whether an answer entry has every Jawaban field and integer id_soal/status
+def jawaban_valid(data):
+    return (isinstance(data, dict) and all(kolom in data for kolom in kolom_jawaban_teks)
+            and ke_int(data.get('id_soal')) is not None and ke_int(data.get('status')) is not None)
+
+
+# Add Batch Jawaban
+@app.route('/jawaban/batch', methods=['POST'])
+@tiket_required
+def add_batch_jawaban():
+    body = request.get_json(silent=True)
+    body = body if isinstance(body, dict) else {}
+    id_siswa = ke_int(body.get('id_siswa'))
+    id_ujian = ke_int(body.get('id_ujian'))
+    data = body.get('data')
+
+    # Nothing is written unless the ids are integers, data is a list and
+    # every entry is a complete Jawaban with integer id_soal and status
+    if id_siswa is None or id_ujian is None or not isinstance(data, list):
+        return jsonify({'message': pesan_jawaban_invalid}), 400
+
+    ditolak = [{'index': index, 'data': i} for index, i in enumerate(data) if not jawaban_valid(i)]
+
+    if ditolak:
+        return jsonify({'message': pesan_jawaban_invalid, 'ditolak': ditolak}), 400
+
+    rows = [{'id_siswa': id_siswa, 'id_ujian': id_ujian, 'id_soal': ke_int(i['id_soal']),
+             'jawaban': i['jawaban'], 'kunci': i['kunci'], 'analisis': i['analisis'],
+             'keterangan': i['keterangan'], 'status': ke_int(i['status']), 'pertanyaan': i['pertanyaan']}
+            for i in data]
+
+    if rows:
+        db.session.execute(Jawaban.__table__.insert(), rows)
+        db.session.commit()
+
+    return jsonify({'id_siswa': id_siswa, 'id_ujian': id_ujian, 'jumlah': len(rows)})
+
 # Delete Jawaban
 @app.route('/jawaban/<id>', methods=['DELETE'])
 def delete_jawaban(id):
@@ -972,14 +1831,130 @@ def delete_all_jawaban(id_siswa, id_ujian):
 
     return jsonify(result)
 
+# Export Jawaban by Ujian
+# Same layout as siswa.csv/soal.csv: header row, no index column. The rows
+# go back in through POST /jawaban/upload-batch/<id_ujian>.
+kolom_export_jawaban = ('id_siswa', 'id_soal', 'jawaban', 'kunci', 'analisis',
+                        'keterangan', 'status', 'pertanyaan')
 
-# Model Hasil Manual
-class HasilManual(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    id_siswa = db.Column(db.Integer)
-    id_kelas = db.Column(db.Integer)
-    id_soal = db.Column(db.Integer)
-    id_bank_soal = db.Column(db.Integer)
+
+@app.route('/ujian/<id>/export', methods=['GET'])
+def export_jawaban_ujian(id):
+    format = request.args.get('format', 'ndjson')
+
+    if format not in ('ndjson', 'csv'):
+        return jsonify({'message': 'format must be ndjson or csv'}), 400
+
+    chunk_size = app.config['EXPORT_CHUNK_SIZE']
+    rows = db.session.query(*[getattr(Jawaban, kolom) for kolom in kolom_export_jawaban]).filter(
+        Jawaban.id_ujian == id).order_by(Jawaban.id).yield_per(chunk_size)
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(kolom_export_jawaban)
+
+        for index, row in enumerate(rows, 1):
+            writer.writerow(row)
+
+            if index % chunk_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        yield buffer.getvalue()
+
+    def generate_ndjson():
+        lines = []
+
+        for row in rows:
+            lines.append(json.dumps(dict(zip(kolom_export_jawaban, row))))
+
+            if len(lines) == chunk_size:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    if format == 'csv':
+        response = Response(stream_with_context(generate_csv()), mimetype='text/csv')
+    else:
+        response = Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+
+    response.headers['Content-Disposition'] = 'attachment; filename=jawaban-ujian-%s.%s' % (id, format)
+
+    return response
+
+# Upload Batch Jawaban
+# Body: {"data": [...]}, the rows of an export (CSV cells parsed as strings
+# or NDJSON lines) for the Ujian in the URL. Nothing is written when a row
+# has no integer id_siswa, id_soal or status or misses a column.
+@app.route('/jawaban/upload-batch/<int:id>', methods=['POST'])
+def upload_batch_jawaban(id):
+    body = request.get_json(silent=True)
+    data = body.get('data') if isinstance(body, dict) else None
+
+    if not isinstance(data, list):
+        return jsonify({'message': 'data must be a list'}), 400
+
+    ditolak = [{'index': index, 'data': i} for index, i in enumerate(data)
+               if not jawaban_valid(i) or ke_int(i.get('id_siswa')) is None]
+
+    if ditolak:
+        return jsonify({'message': 'rows need every export column and integer id_siswa, id_soal and status',
+                        'ditolak': ditolak}), 400
+
+    rows = [{'id_siswa': ke_int(i['id_siswa']), 'id_ujian': id, 'id_soal': ke_int(i['id_soal']),
+             'jawaban': i['jawaban'], 'kunci': i['kunci'], 'analisis': i['analisis'],
+             'keterangan': i['keterangan'], 'status': ke_int(i['status']), 'pertanyaan': i['pertanyaan']}
+            for i in data]
+
+    if rows:
+        db.session.execute(Jawaban.__table__.insert(), rows)
+        db.session.commit()
+
+    return jsonify({'id_ujian': id, 'jumlah': len(rows)})
+
+
+# Summary of an Ujian for the teacher dashboard
+# Read from the ringkasan_* tables that the jawaban triggers of migration
+# 0007 keep current, so the cost does not grow with the number of answers.
+@app.route('/ujian/<int:id>/summary', methods=['GET'])
+def get_ujian_summary(id):
+    siswa = db.session.execute(
+        'SELECT r.id_siswa, s.nama, r.jumlah, r.benar FROM ringkasan_siswa r '
+        'LEFT JOIN siswa s ON s.id = r.id_siswa WHERE r.id_ujian = :id ORDER BY r.id_siswa', {'id': id})
+    soal = db.session.execute(
+        'SELECT id_soal, jumlah, benar FROM ringkasan_soal WHERE id_ujian = :id ORDER BY id_soal', {'id': id})
+    analisis = db.session.execute(
+        'SELECT analisis, jumlah FROM ringkasan_analisis WHERE id_ujian = :id ORDER BY jumlah DESC, analisis',
+        {'id': id})
+
+    result = {
+        'id_ujian': id,
+        'siswa': [{'id_siswa': id_siswa, 'nama': nama, 'jumlah': jumlah, 'benar': benar,
+                   'nilai': round(100.0 * benar / jumlah, 2) if jumlah else 0}
+                  for id_siswa, nama, jumlah, benar in siswa],
+        'soal': [{'id_soal': id_soal, 'jumlah': jumlah, 'benar': benar,
+                  'persentase_benar': round(100.0 * benar / jumlah, 2) if jumlah else 0}
+                 for id_soal, jumlah, benar in soal],
+        'analisis': [{'analisis': nama, 'jumlah': jumlah} for nama, jumlah in analisis],
+    }
+    result['jumlah_siswa'] = len(result['siswa'])
+
+    return jsonify(result)
+
+
+# Model Hasil Manual
+class HasilManual(db.Model):
+    __table_args__ = (db.Index('ix_hasil_manual_id_kelas_id_soal_id_bank_soal', 'id_kelas', 'id_soal', 'id_bank_soal'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    id_siswa = db.Column(db.Integer)
+    id_kelas = db.Column(db.Integer)
+    id_soal = db.Column(db.Integer)
+    id_bank_soal = db.Column(db.Integer)
     status = db.Column(db.Integer)
     b = db.Column(db.Float)
     a = db.Column(db.Float)
@@ -1021,17 +1996,26 @@ def get_hasil_manual_by_id_kelas(id_kelas, id_soal, id_bank_soal):
     return jsonify(result)
 
 
+# Insert a Hasil Manual row for every Siswa of the kelas that has none yet
+def insert_hasil_manual(id_kelas, id_soal, id_bank_soal):
+    sudah_ada = db.exists().where(db.and_(
+        HasilManual.id_siswa == Siswa.id, HasilManual.id_kelas == id_kelas,
+        HasilManual.id_soal == id_soal, HasilManual.id_bank_soal == id_bank_soal))
+
+    siswa = db.select([Siswa.id, db.literal(id_kelas), db.literal(id_soal), db.literal(id_bank_soal),
+                       db.literal(0), db.literal(0), db.literal(0), db.literal(0), db.literal(0), db.literal(0)]
+                      ).where(db.and_(Siswa.id_kelas == id_kelas, ~sudah_ada)).order_by(Siswa.id)
+
+    db.session.execute(HasilManual.__table__.insert().from_select(
+        ['id_siswa', 'id_kelas', 'id_soal', 'id_bank_soal', 'status', 'b', 'a', 'l', 'el', 'p'], siswa))
+
+
 # Sync with id_kelas
 @app.route('/hasil-manual/sync/<id_kelas>/<id_soal>/<id_bank_soal>', methods=['POST'])
 def sync_hasil_manual_by_id_kelas(id_kelas, id_soal, id_bank_soal):
-    all_siswa = Siswa.query.filter_by(id_kelas=id_kelas)
-    result = siswas_schema.dump(all_siswa)
-
-    for i in result:
-        temp = HasilManual(i['id'], id_kelas, id_soal,
-                           id_bank_soal, 0, 0, 0, 0, 0, 0)
-        db.session.add(temp)
-        db.session.commit()
+    insert_hasil_manual(id_kelas, id_soal, id_bank_soal)
+    kalibrasi_bobot_soal(id_kelas, id_soal, id_bank_soal)
+    db.session.commit()
 
     hasil_manual = HasilManual.query.filter_by(
         id_kelas=id_kelas, id_soal=id_soal, id_bank_soal=id_bank_soal)
@@ -1045,6 +2029,8 @@ def change_status_hasil_manual(id, status):
     hasil_manual = HasilManual.query.get(id)
     hasil_manual.status = status
 
+    db.session.flush()
+    kalibrasi_bobot_soal(hasil_manual.id_kelas, hasil_manual.id_soal, hasil_manual.id_bank_soal)
     db.session.commit()
 
     return hasil_manual_schema.jsonify(hasil_manual)
@@ -1052,21 +2038,12 @@ def change_status_hasil_manual(id, status):
 # Hard Refresh
 @app.route('/hasil-manual/hard-refresh/<id_kelas>/<id_soal>/<id_bank_soal>', methods=['DELETE'])
 def hard_refresh_hasil_manual(id_kelas, id_soal, id_bank_soal):
-    hasil_manual = HasilManual.query.filter_by(
-        id_kelas=id_kelas, id_soal=id_soal, id_bank_soal=id_bank_soal)
-
-    for x in hasil_manual:
-        db.session.delete(x)
-        db.session.commit()
+    HasilManual.query.filter_by(
+        id_kelas=id_kelas, id_soal=id_soal, id_bank_soal=id_bank_soal).delete(synchronize_session=False)
 
-    all_siswa = Siswa.query.filter_by(id_kelas=id_kelas)
-    result = siswas_schema.dump(all_siswa)
-
-    for i in result:
-        temp = HasilManual(i['id'], id_kelas, id_soal,
-                           id_bank_soal, 0, 0, 0, 0, 0, 0)
-        db.session.add(temp)
-        db.session.commit()
+    insert_hasil_manual(id_kelas, id_soal, id_bank_soal)
+    kalibrasi_bobot_soal(id_kelas, id_soal, id_bank_soal)
+    db.session.commit()
 
     hasil_manual = HasilManual.query.filter_by(
         id_kelas=id_kelas, id_soal=id_soal, id_bank_soal=id_bank_soal)
@@ -1075,30 +2052,117 @@ def hard_refresh_hasil_manual(id_kelas, id_soal, id_bank_soal):
     return jsonify(new_result)
 
 # Batch update Hasil Manual
+# data is a list of {id, status} or {id_siswa, status}; entries whose id or
+# status is not an integer are listed back with a 400
 @app.route('/hasil-manual/batch-update/<id_kelas>/<id_soal>/<id_bank_soal>', methods=['PUT'])
 def batch_update_hasil_manual(id_kelas, id_soal, id_bank_soal):
-    hasil_manual = HasilManual.query.filter_by(
-        id_kelas=id_kelas, id_soal=id_soal, id_bank_soal=id_bank_soal)
+    hasil_manual = db.session.query(HasilManual.__table__).filter_by(
+        id_kelas=id_kelas, id_soal=id_soal, id_bank_soal=id_bank_soal).order_by(HasilManual.id)
+    hasil_manual = {row.id: row._asdict() for row in hasil_manual}
+    id_by_siswa = {row['id_siswa']: id for id, row in hasil_manual.items()}
 
     data = request.json['data']
-    index = 0
+    changed = {}
+    ditolak = []
 
-    for i in data:
-        temp = HasilManual.query.get(hasil_manual[index].id)
-        temp.status = i['status']
+    for index, i in enumerate(data):
+        i = i if isinstance(i, dict) else {}
+        kunci = 'id' if 'id' in i else 'id_siswa'
+        nilai = ke_int(i.get(kunci))
+        status = ke_int(i.get('status'))
+
+        if nilai is None or status is None:
+            ditolak.append({'index': index, 'data': data[index]})
+            continue
+
+        id = nilai if kunci == 'id' else id_by_siswa.get(nilai)
+
+        if id in hasil_manual and hasil_manual[id]['status'] != status:
+            changed[id] = status
+
+    # Nothing is written when any entry is malformed
+    if ditolak:
+        return jsonify({'message': 'id and status must be integers', 'ditolak': ditolak}), 400
+
+    if changed:
+        db.session.bulk_update_mappings(HasilManual, [
+            {'id': id, 'status': status} for id, status in changed.items()])
+        kalibrasi_bobot_soal(id_kelas, id_soal, id_bank_soal)
         db.session.commit()
-        index = index + 1
 
+    result = []
+
+    for id in sorted(changed):
+        hasil_manual[id]['status'] = changed[id]
+        result.append(hasil_manual[id])
+
+    return jsonify(many_hasil_manual_schema.dump(result))
+
+
+# Fill the Hasil Manual matrix of a kelas and bank soal from Jawaban
+# The latest answer of every siswa to every soal, over all Ujian of that
+# kelas and bank soal, is aggregated once into a temp table. Existing rows
+# with a different status are updated, missing (siswa, soal) pairs are
+# inserted (status 0 when there is no answer) and rows without an answer
+# keep their manual status.
+def derive_hasil_manual(id_kelas, id_bank_soal):
+    params = {'id_kelas': id_kelas, 'id_bank_soal': id_bank_soal}
+
+    db.session.execute('CREATE TEMP TABLE IF NOT EXISTS derive_hasil_manual '
+                       '(id_siswa INTEGER NOT NULL, id_soal INTEGER NOT NULL, status INTEGER NOT NULL, '
+                       'PRIMARY KEY (id_siswa, id_soal))')
+    db.session.execute('DELETE FROM temp.derive_hasil_manual')
+
+    jawaban = db.session.execute(
+        'INSERT INTO temp.derive_hasil_manual (id_siswa, id_soal, status) '
+        'SELECT jawaban.id_siswa, jawaban.id_soal, CASE WHEN jawaban.status = 1 THEN 1 ELSE 0 END '
+        'FROM jawaban WHERE jawaban.id IN ('
+        '  SELECT MAX(jawaban.id) FROM jawaban'
+        '  JOIN ujian ON ujian.id = jawaban.id_ujian'
+        '  JOIN siswa ON siswa.id = jawaban.id_siswa'
+        '  JOIN soal ON soal.id = jawaban.id_soal'
+        '  WHERE ujian.id_kelas = :id_kelas AND ujian.id_bank_soal = :id_bank_soal'
+        '  AND siswa.id_kelas = :id_kelas AND soal.id_bank_soal = :id_bank_soal'
+        '  GROUP BY jawaban.id_siswa, jawaban.id_soal)', params).rowcount
+
+    diperbarui = db.session.execute(
+        'UPDATE hasil_manual SET status = ('
+        '  SELECT d.status FROM temp.derive_hasil_manual d'
+        '  WHERE d.id_siswa = hasil_manual.id_siswa AND d.id_soal = hasil_manual.id_soal) '
+        'WHERE id_kelas = :id_kelas AND id_bank_soal = :id_bank_soal AND EXISTS ('
+        '  SELECT 1 FROM temp.derive_hasil_manual d'
+        '  WHERE d.id_siswa = hasil_manual.id_siswa AND d.id_soal = hasil_manual.id_soal'
+        '  AND d.status IS NOT hasil_manual.status)', params).rowcount
+
+    ditambah = db.session.execute(
+        'INSERT INTO hasil_manual (id_siswa, id_kelas, id_soal, id_bank_soal, status, b, a, l, el, p) '
+        'SELECT siswa.id, :id_kelas, soal.id, :id_bank_soal, COALESCE(d.status, 0), 0, 0, 0, 0, 0 '
+        'FROM siswa JOIN soal ON soal.id_bank_soal = :id_bank_soal '
+        'LEFT JOIN temp.derive_hasil_manual d ON d.id_siswa = siswa.id AND d.id_soal = soal.id '
+        'WHERE siswa.id_kelas = :id_kelas AND NOT EXISTS ('
+        '  SELECT 1 FROM hasil_manual h WHERE h.id_siswa = siswa.id AND h.id_kelas = :id_kelas'
+        '  AND h.id_soal = soal.id AND h.id_bank_soal = :id_bank_soal) '
+        'ORDER BY soal.id, siswa.id', params).rowcount
+
+    db.session.execute('DROP TABLE temp.derive_hasil_manual')
+
+    return {'jawaban': jawaban, 'diperbarui': diperbarui, 'ditambah': ditambah}
+
+# Derive Hasil Manual from Jawaban, run before /bobot/generate
+@app.route('/hasil-manual/derive/<int:id_kelas>/<int:id_bank_soal>', methods=['POST'])
+def derive_hasil_manual_by_id_kelas(id_kelas, id_bank_soal):
+    result = derive_hasil_manual(id_kelas, id_bank_soal)
+    db.session.commit()
 
-    hasil_manual = HasilManual.query.filter_by(
-        id_kelas=id_kelas, id_soal=id_soal, id_bank_soal=id_bank_soal)
-    result = many_hasil_manual_schema.dump(hasil_manual)
+    result.update({'id_kelas': id_kelas, 'id_bank_soal': id_bank_soal})
 
     return jsonify(result)
 
 
 # Model Bobot
 class Bobot(db.Model):
+    __table_args__ = (db.Index('ix_bobot_id_kelas_id_bank_soal_cluster', 'id_kelas', 'id_bank_soal', 'cluster'),)
+
     id = db.Column(db.Integer, primary_key=True)
     id_kelas = db.Column(db.Integer)
     id_soal = db.Column(db.Integer)
@@ -1110,6 +2174,7 @@ class Bobot(db.Model):
     el = db.Column(db.Float)
     p = db.Column(db.Float)
     cluster = db.Column(db.Integer)
+    metode = db.Column(db.String(20))
 
     def __init__(self, id_kelas, id_soal, pertanyaan, id_bank_soal, b, a, l, el, p, cluster):
         self.id_kelas = id_kelas
@@ -1128,97 +2193,353 @@ class Bobot(db.Model):
 class BobotSchema(ma.Schema):
     class Meta:
         fields = ('id', 'id_kelas', 'id_soal', 'pertanyaan',
-                  'id_bank_soal', 'b', 'a', 'l', 'el', 'p', 'cluster')
+                  'id_bank_soal', 'b', 'a', 'l', 'el', 'p', 'cluster', 'metode')
 
 
 # Init Schema Bobot
 bobot_schema = BobotSchema()
 many_bobot_schema = BobotSchema(many=True)
 
+
+# The many_bobot_schema dump of one kelas and bank soal, read as plain
+# column rows instead of through Bobot objects
+def dump_bobot(id_kelas, id_bank_soal):
+    fields = BobotSchema.Meta.fields
+    tabel = Bobot.__table__
+    rows = db.session.execute(db.select([tabel.c[f] for f in fields]).where(db.and_(
+        tabel.c.id_kelas == id_kelas, tabel.c.id_bank_soal == id_bank_soal)).order_by(tabel.c.id))
+
+    return [dict(zip(fields, row)) for row in rows]
+
+# Routing table for the adaptive test, per (id_kelas, id_bank_soal):
+# 'next' maps id_soal to (z_akhir, jenis) for a wrong and a right answer,
+# 'cluster' holds the ordered id_soal list of every cluster
+routing_bobot = {}
+
+
+# Fuzzy rules for the next soal
+def hitung_z_akhir(status, cluster, b, a):
+    if (status == 0):
+        if (cluster == 0):
+            return 0
+        elif (cluster == 1):
+            return 0
+        else:
+            return 0.2
+
+    b_turun = (3-b)/6
+    b_naik = (b+3)/6
+
+    a_turun = (3-a)/6
+    a_naik = (a+3)/6
+
+    rule_1 = min(b_turun, a_naik)
+    rule_2 = min(b_turun, a_turun)
+    rule_3 = min(b_naik, a_turun)
+    rule_4 = min(b_naik, a_naik)
+
+    z_1 = -((6*rule_1) - 3)
+    z_2 = -((6*rule_2) - 3)
+    z_3 = (6*rule_3) - 3
+    z_4 = (6*rule_4) - 3
+
+    return ((rule_1 * z_1) + (rule_2 * z_2) + (rule_3 * z_3) + (rule_4 * z_4)) / (rule_1 + rule_2 + rule_3 + rule_4)
+
+
+def jenis_soal(z_akhir):
+    if (z_akhir < 0.1):
+        return 0
+    elif (z_akhir > 0.3):
+        return 2
+    return 1
+
+
+# Build routing table from Bobot
+def build_routing_bobot(id_kelas, id_bank_soal):
+    bobot = db.session.query(Bobot.id_soal, Bobot.b, Bobot.a, Bobot.cluster).filter_by(
+        id_kelas=id_kelas, id_bank_soal=id_bank_soal).order_by(Bobot.id)
+
+    routing = {'next': {}, 'cluster': {0: [], 1: [], 2: []}}
+
+    for id_soal, b, a, cluster in bobot:
+        # Rows that were synced but never calibrated (or calibrated on an
+        # empty Hasil Manual) have no b and a yet
+        if b is None or a is None:
+            continue
+
+        z_salah = hitung_z_akhir(0, cluster, b, a)
+        z_benar = hitung_z_akhir(1, cluster, b, a)
+        routing['next'][id_soal] = ((z_salah, jenis_soal(z_salah)), (z_benar, jenis_soal(z_benar)))
+
+        if cluster in routing['cluster']:
+            routing['cluster'][cluster].append(id_soal)
+
+    routing_bobot[(int(id_kelas), int(id_bank_soal))] = routing
+
+    return routing
+
+
+def get_routing_bobot(id_kelas, id_bank_soal):
+    routing = routing_bobot.get((int(id_kelas), int(id_bank_soal)))
+
+    if routing is None:
+        routing = build_routing_bobot(id_kelas, id_bank_soal)
+
+    return routing
+
+
+def drop_routing_bobot(id_kelas, id_bank_soal):
+    routing_bobot.pop((int(id_kelas), int(id_bank_soal)), None)
+
+
+def invalidate_bobot(id_kelas, id_bank_soal):
+    invalidate('bobot:%d:%d' % (int(id_kelas), int(id_bank_soal)))
+
+
+# Add "jenis" to a serialized Soal payload without decoding it
+def with_jenis(payload, jenis):
+    jenis = b'"jenis": %d' % jenis
+
+    if payload.strip() == b'{}':
+        return b'{' + jenis + b'}'
+
+    return b'{' + jenis + b', ' + payload.lstrip()[1:]
+
+
 # Get First Soal
 @app.route('/bobot/first-soal/<id_kelas>/<id_bank_soal>', methods=['GET'])
+@tiket_required
 def get_first_soal(id_kelas, id_bank_soal):
-    bobot = Bobot.query.filter_by(id_kelas=id_kelas, id_bank_soal=id_bank_soal, cluster=0).first()
-    soal = Soal.query.get(bobot.id_soal)
-    result = custom_soal_schema.dump(soal)
+    routing = get_routing_bobot(id_kelas, id_bank_soal)
 
-    return jsonify(result)
+    if not routing['cluster'][0]:
+        return jsonify({'message': 'bobot belum dikalibrasi'}), 409
+
+    return json_response(get_soal_payload(id_bank_soal, routing['cluster'][0][0]))
 
 # Get Next Soal
 @app.route('/bobot/next-soal/<id_kelas>/<id_bank_soal>/<id_soal>/<int:status>/<int:index_mudah>/<int:index_sedang>/<int:index_susah>', methods=['GET'])
+@tiket_required
 def get_next_soal(id_kelas, id_bank_soal, id_soal, status, index_mudah, index_sedang, index_susah):
-    bobot = Bobot.query.filter_by(id_kelas=id_kelas, id_bank_soal=id_bank_soal, id_soal=id_soal).first()
-    z_akhir = -2
-    if (status == 0):
-        if (bobot.cluster == 0):
-            z_akhir = 0
-        elif (bobot. cluster == 1):
-            z_akhir = 0
-        else:
-            z_akhir = 0.2
-    else:
-        b_turun = (3-bobot.b)/6
-        b_naik = (bobot.b+3)/6
+    routing = get_routing_bobot(id_kelas, id_bank_soal)
+    berikut = routing['next'].get(int(id_soal))
 
-        a_turun = (3-bobot.a)/6
-        a_naik = (bobot.a+3)/6
+    if berikut is None:
+        return jsonify({'message': 'soal not found'}), 404
 
-        rule_1 = min(b_turun, a_naik)
-        rule_2 = min(b_turun, a_turun)
-        rule_3 = min(b_naik, a_turun)
-        rule_4 = min(b_naik, a_naik)
+    z_akhir, jenis = berikut[status != 0]
+    index = (index_mudah, index_sedang, index_susah)
 
-        z_1 = -((6*rule_1) - 3)
-        z_2 = -((6*rule_2) - 3)
-        z_3 = (6*rule_3) - 3
-        z_4 = (6*rule_4) - 3
+    # A used-up cluster falls back to the nearest one that still has soal
+    for pilihan in urutan_cluster(jenis):
+        if index[pilihan] < len(routing['cluster'][pilihan]):
+            payload = get_soal_payload(id_bank_soal, routing['cluster'][pilihan][index[pilihan]])
+            return json_response(with_jenis(payload, pilihan))
 
-        z_akhir = ((rule_1 * z_1) + (rule_2 * z_2) + (rule_3 * z_3) + (rule_4 * z_4)) / (rule_1 + rule_2 + rule_3 + rule_4)
+    return jsonify({'message': 'soal sudah habis'}), 404
 
-    if (z_akhir < 0.1):
-        bobot = Bobot.query.filter_by(id_kelas=id_kelas, id_bank_soal=id_bank_soal, cluster=0)
-        bobot = many_bobot_schema.dump(bobot)
-        soal = Soal.query.get(bobot[index_mudah]['id_soal'])
-        result = custom_soal_schema.dump(soal)
-        result["jenis"] = 0
-    elif (z_akhir > 0.3):
-        bobot = Bobot.query.filter_by(id_kelas=id_kelas, id_bank_soal=id_bank_soal, cluster=2)
-        bobot = many_bobot_schema.dump(bobot)
-        soal = Soal.query.get(bobot[index_susah]['id_soal'])    
-        result = custom_soal_schema.dump(soal)
-        result["jenis"] = 2
-    else:
-        bobot = Bobot.query.filter_by(id_kelas=id_kelas, id_bank_soal=id_bank_soal, cluster=1)
-        bobot = many_bobot_schema.dump(bobot)
-        soal = Soal.query.get(bobot[index_sedang]['id_soal'])
-        result = custom_soal_schema.dump(soal)
-        result["jenis"] = 1
+# Model Sesi Ujian
+# Server-side state of one adaptive exam: the soal currently shown, the
+# soal already answered (dilayani, JSON) and how many soal of every cluster
+# were served, so clients no longer send them
+class SesiUjian(db.Model):
+    __table_args__ = (db.UniqueConstraint('id_siswa', 'id_ujian', name='uq_sesi_ujian_id_siswa_id_ujian'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    id_siswa = db.Column(db.Integer)
+    id_ujian = db.Column(db.Integer)
+    id_kelas = db.Column(db.Integer)
+    id_bank_soal = db.Column(db.Integer)
+    id_soal = db.Column(db.Integer)
+    jenis = db.Column(db.Integer)
+    index_mudah = db.Column(db.Integer)
+    index_sedang = db.Column(db.Integer)
+    index_susah = db.Column(db.Integer)
+    jumlah = db.Column(db.Integer)
+    selesai = db.Column(db.Integer)
+    dilayani = db.Column(db.Text)
+
+    def __init__(self, id_siswa, id_ujian, id_kelas, id_bank_soal):
+        self.id_siswa = id_siswa
+        self.id_ujian = id_ujian
+        self.id_kelas = id_kelas
+        self.id_bank_soal = id_bank_soal
+        self.id_soal = None
+        self.jenis = None
+        self.index_mudah = 0
+        self.index_sedang = 0
+        self.index_susah = 0
+        self.jumlah = 0
+        self.selesai = 0
+        self.dilayani = '[]'
+
+
+# Clusters to try for a jenis: itself, then the nearest (easier first on a tie)
+def urutan_cluster(jenis):
+    return sorted(range(3), key=lambda k: (abs(k - jenis), k))
+
+
+# Session column counting the soal served from each cluster
+kolom_index = ('index_mudah', 'index_sedang', 'index_susah')
+
+
+# Take the first soal of a cluster that was not served yet; when the
+# cluster is used up, fall back to the nearest cluster that still has soal.
+# Works from id_soal, so a routing table rebuilt by /cluster mid-exam never
+# serves a soal twice.
+def ambil_soal(routing, dilayani, jenis):
+    for pilihan in urutan_cluster(jenis):
+        for id_soal in routing['cluster'][pilihan]:
+            if id_soal not in dilayani:
+                return id_soal, pilihan
+
+    return None, None
+
+
+def sesi_response(sesi):
+    sesi_json = json.dumps({'id_ujian': sesi.id_ujian, 'id_siswa': sesi.id_siswa, 'jumlah': sesi.jumlah,
+                            'selesai': bool(sesi.selesai)}).encode()
+
+    if sesi.id_soal is None:
+        return json_response(b'{"sesi": ' + sesi_json + b', "soal": null}')
+
+    payload = with_jenis(get_soal_payload(sesi.id_bank_soal, sesi.id_soal), sesi.jenis)
+
+    return json_response(b'{"sesi": ' + sesi_json + b', "soal": ' + payload + b'}')
+
+
+# Exam Step
+# Body: {"id_siswa": ..., "jawaban": {"id_soal", "jawaban", "kunci", "analisis",
+# "keterangan", "status", "pertanyaan"}}. Without "jawaban" it starts (or
+# resumes) the session and returns the current soal; with it, the answer
+# to the current soal is stored and the next soal is returned. The siswa
+# must exist and belong to the kelas of the ujian, and the ujian must be
+# active (status 1).
+@app.route('/ujian/<int:id_ujian>/step', methods=['POST'])
+@tiket_required
+def step_ujian(id_ujian):
+    body = request.get_json(silent=True)
+    body = body if isinstance(body, dict) else {}
+    id_siswa = ke_int(g.tiket['id_siswa'] if g.tiket is not None else body.get('id_siswa'))
+    data = body.get('jawaban')
+
+    if id_siswa is None:
+        return jsonify({'message': 'id_siswa must be an integer'}), 400
+
+    # A bad answer never starts or advances the session
+    if data is not None and not jawaban_valid(data):
+        return jsonify({'message': pesan_jawaban_invalid}), 400
+
+    # Only a siswa of the kelas of an active ujian gets a session
+    ujian = Ujian.query.get(id_ujian)
+    siswa = Siswa.query.get(id_siswa)
+
+    if ujian is None:
+        return jsonify({'message': 'ujian not found'}), 404
+
+    if siswa is None:
+        return jsonify({'message': 'siswa not found'}), 404
+
+    if siswa.id_kelas != ujian.id_kelas:
+        return jsonify({'message': 'ujian bukan untuk kelas siswa'}), 403
+
+    if ujian.status != 1:
+        return jsonify({'message': 'ujian tidak aktif'}), 403
+
+    sesi = SesiUjian.query.filter_by(id_siswa=id_siswa, id_ujian=id_ujian).first()
+
+    if sesi is None:
+        sesi = SesiUjian(id_siswa, id_ujian, ujian.id_kelas, ujian.id_bank_soal)
+        routing = get_routing_bobot(sesi.id_kelas, sesi.id_bank_soal)
+        sesi.id_soal, sesi.jenis = ambil_soal(routing, set(), 0)
+
+        # No calibrated soal yet is temporary, so nothing is saved
+        if sesi.id_soal is None:
+            return jsonify({'message': 'bobot belum dikalibrasi'}), 409
+
+        setattr(sesi, kolom_index[sesi.jenis], 1)
+
+        db.session.add(sesi)
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another request started the same session first
+            db.session.rollback()
+            sesi = SesiUjian.query.filter_by(id_siswa=id_siswa, id_ujian=id_ujian).first()
+
+    if data is None or sesi.selesai:
+        return sesi_response(sesi)
+
+    if ke_int(data['id_soal']) != sesi.id_soal:
+        return jsonify({'message': 'soal sudah dijawab', 'id_soal': sesi.id_soal}), 409
+
+    routing = get_routing_bobot(sesi.id_kelas, sesi.id_bank_soal)
+
+    if not routing['next']:
+        return jsonify({'message': 'bobot belum dikalibrasi'}), 409
+
+    # A soal that lost its Bobot since it was served stays in its cluster
+    berikut = routing['next'].get(sesi.id_soal)
+    jenis = sesi.jenis if berikut is None else berikut[ke_int(data['status']) != 0][1]
+    dilayani = json.loads(sesi.dilayani or '[]') + [sesi.id_soal]
+    id_soal, jenis = ambil_soal(routing, set(dilayani), jenis)
+
+    db.session.add(Jawaban(id_siswa, id_ujian, sesi.id_soal, data['jawaban'], data['kunci'], data['analisis'],
+                           data['keterangan'], ke_int(data['status']), data['pertanyaan']))
+
+    # Only advance from the soal that was answered; a concurrent duplicate
+    # step updates nothing and is rolled back
+    perubahan = {'id_soal': id_soal, 'jenis': jenis, 'dilayani': json.dumps(dilayani),
+                 'jumlah': SesiUjian.jumlah + 1, 'selesai': int(id_soal is None)}
+
+    if id_soal is not None:
+        perubahan[kolom_index[jenis]] = getattr(SesiUjian, kolom_index[jenis]) + 1
+
+    updated = SesiUjian.query.filter_by(id=sesi.id, id_soal=sesi.id_soal).update(
+        perubahan, synchronize_session=False)
+
+    if not updated:
+        db.session.rollback()
+        return jsonify({'message': 'soal sudah dijawab'}), 409
+
+    db.session.commit()
+    db.session.refresh(sesi)
+
+    return sesi_response(sesi)
 
-    return jsonify(result)
 
 # Get All Bobot by id_kelas id_soal id_bank_soal
 @app.route('/bobot/<id_kelas>/<id_bank_soal>', methods=['GET'])
 def get_all_bobot_custom(id_kelas, id_bank_soal):
     bobot = Bobot.query.filter_by(
-        id_kelas=id_kelas, id_bank_soal=id_bank_soal)
+        id_kelas=id_kelas, id_bank_soal=id_bank_soal).order_by(Bobot.id)
     result = many_bobot_schema.dump(bobot)
 
     return jsonify(result)
 
+# Insert a Bobot row for every Soal of the bank soal that has none yet
+def insert_bobot(id_kelas, id_bank_soal):
+    sudah_ada = db.exists().where(db.and_(
+        Bobot.id_soal == Soal.id, Bobot.id_kelas == id_kelas, Bobot.id_bank_soal == id_bank_soal))
+
+    soal = db.select([db.literal(id_kelas), Soal.id, Soal.pertanyaan, db.literal(id_bank_soal),
+                      db.literal(0), db.literal(0), db.literal(0), db.literal(0), db.literal(0), db.literal(0)]
+                     ).where(db.and_(Soal.id_bank_soal == id_bank_soal, ~sudah_ada)).order_by(Soal.id)
+
+    db.session.execute(Bobot.__table__.insert().from_select(
+        ['id_kelas', 'id_soal', 'pertanyaan', 'id_bank_soal', 'b', 'a', 'l', 'el', 'p', 'cluster'], soal))
+
+
 # Sync Bobot
 @app.route('/bobot/sync/<id_kelas>/<id_bank_soal>', methods=['POST'])
 def sync_bobot(id_kelas, id_bank_soal):
-    all_soal = Soal.query.filter_by(id_bank_soal=id_bank_soal)
-    result = many_soal_schema.dump(all_soal)
-
-    for i in result:
-        temp = Bobot(id_kelas, i['id'], i['pertanyaan'],
-                     id_bank_soal, 0, 0, 0, 0, 0, 0)
-        db.session.add(temp)
-        db.session.commit()
+    insert_bobot(id_kelas, id_bank_soal)
+    invalidate_bobot(id_kelas, id_bank_soal)
+    db.session.commit()
 
     bobot = Bobot.query.filter_by(
-        id_kelas=id_kelas, id_bank_soal=id_bank_soal)
+        id_kelas=id_kelas, id_bank_soal=id_bank_soal).order_by(Bobot.id)
     result = many_bobot_schema.dump(bobot)
 
     return jsonify(result)
@@ -1226,170 +2547,820 @@ def sync_bobot(id_kelas, id_bank_soal):
 # Hard refresh bobot
 @app.route('/bobot/hard-refresh/<id_kelas>/<id_bank_soal>', methods=['DELETE'])
 def hard_refresh_bobot(id_kelas, id_bank_soal):
-    bobot = Bobot.query.filter_by(
-        id_kelas=id_kelas, id_bank_soal=id_bank_soal)
-    
-    for x in bobot:
-        db.session.delete(x)
-        db.session.commit()
+    Bobot.query.filter_by(
+        id_kelas=id_kelas, id_bank_soal=id_bank_soal).delete(synchronize_session=False)
 
-    all_soal = Soal.query.filter_by(id_bank_soal=id_bank_soal)
-    result = many_soal_schema.dump(all_soal)
-
-    for i in result:
-        temp = Bobot(id_kelas, i['id'], i['pertanyaan'],
-                     id_bank_soal, 0, 0, 0, 0, 0, 0)
-        db.session.add(temp)
-        db.session.commit()
+    insert_bobot(id_kelas, id_bank_soal)
+    invalidate_bobot(id_kelas, id_bank_soal)
+    db.session.commit()
 
     bobot = Bobot.query.filter_by(
-        id_kelas=id_kelas, id_bank_soal=id_bank_soal)
+        id_kelas=id_kelas, id_bank_soal=id_bank_soal).order_by(Bobot.id)
     result = many_bobot_schema.dump(bobot)
 
     return jsonify(result)
 
+# Load Hasil Manual matrix (soal x siswa) in one query
+def load_matrix_hasil_manual(id_kelas, id_bank_soal):
+    import numpy as np
+
+    rows = db.session.query(Bobot.id, HasilManual.id_siswa, HasilManual.status).outerjoin(
+        HasilManual, db.and_(HasilManual.id_kelas == Bobot.id_kelas,
+                             HasilManual.id_soal == Bobot.id_soal,
+                             HasilManual.id_bank_soal == Bobot.id_bank_soal)
+    ).filter(Bobot.id_kelas == id_kelas, Bobot.id_bank_soal == id_bank_soal).order_by(HasilManual.id)
+
+    data = np.array([(i, -1 if j is None else j, status or 0) for i, j, status in rows],
+                    dtype=np.int64).reshape(-1, 3)
+
+    id_bobot, baris = np.unique(data[:, 0], return_inverse=True)
+    ada = data[:, 1] >= 0
+
+    # Siswa keep the order they first appear in Hasil Manual
+    id_siswa, pertama, kolom = np.unique(data[ada, 1], return_index=True, return_inverse=True)
+    urutan = np.argsort(pertama)
+    posisi = np.empty_like(urutan)
+    posisi[urutan] = np.arange(len(urutan))
+
+    matrix = np.zeros((len(id_bobot), len(id_siswa)), dtype=np.int64)
+    matrix[baris[ada], posisi[kolom]] = data[ada, 2]
+
+    return id_bobot, id_siswa[urutan], matrix
+
+
+# Response matrix store
+# Every (kelas, bank soal) matrix is kept as int8 .npy files (matrix, Bobot
+# ids, siswa ids) named after its versi_matrix counter, which the triggers
+# of migration 0009 bump on every Hasil Manual or Bobot change. A current
+# file is memory-mapped instead of queried; a stale one is rebuilt.
+def get_matrix_dir():
+    if app.config['MATRIX_DIR'] is None:
+        database = db.engine.url.database
+
+        if database and database != ':memory:':
+            app.config['MATRIX_DIR'] = os.path.abspath(database) + '-matrix'
+        else:
+            app.config['MATRIX_DIR'] = os.path.join(tempfile.gettempdir(), 'apievluasi-matrix')
+
+    return app.config['MATRIX_DIR']
+
+
+def matrix_path(id_kelas, id_bank_soal, versi, bagian):
+    return os.path.join(get_matrix_dir(), '%d_%d_%d.%s.npy' % (int(id_kelas), int(id_bank_soal), versi, bagian))
+
+
+def simpan_matrix(id_kelas, id_bank_soal, versi, arrays):
+    import numpy as np
+
+    directory = get_matrix_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    # matrix is renamed last, so its presence means the ids are complete.
+    # Every writer (a job and a request can rebuild the same versi) has its
+    # own temp file, so a partial file is never renamed into place.
+    for bagian in ('bobot', 'siswa', 'matrix'):
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, arrays[bagian])
+
+            os.replace(tmp, matrix_path(id_kelas, id_bank_soal, versi, bagian))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    # Drop older versions only; a newer one may have just been written
+    awalan = '%d_%d_' % (int(id_kelas), int(id_bank_soal))
+
+    for nama in os.listdir(directory):
+        lama = nama[len(awalan):].split('.')[0]
+
+        if nama.startswith(awalan) and nama.endswith('.npy') and lama.isdigit() and int(lama) < versi:
+            try:
+                os.remove(os.path.join(directory, nama))
+            except OSError:
+                pass
+
+
+def get_matrix_hasil_manual(id_kelas, id_bank_soal):
+    import numpy as np
+
+    # The versi is read before the rows, so a file can only be labelled
+    # older than its content, never newer
+    versi = db.session.execute(
+        'SELECT versi FROM versi_matrix WHERE id_kelas = :id_kelas AND id_bank_soal = :id_bank_soal',
+        {'id_kelas': id_kelas, 'id_bank_soal': id_bank_soal}).scalar() or 0
+
+    try:
+        id_bobot, id_siswa, matrix = (np.load(matrix_path(id_kelas, id_bank_soal, versi, bagian), mmap_mode='r')
+                                      for bagian in ('bobot', 'siswa', 'matrix'))
+
+        # Two writers of one versi may have read different rows; parts that
+        # do not fit together are rebuilt
+        if matrix.shape == (len(id_bobot), len(id_siswa)):
+            return id_bobot, id_siswa, matrix
+    except (OSError, ValueError):
+        pass
+
+    id_bobot, id_siswa, matrix = load_matrix_hasil_manual(id_kelas, id_bank_soal)
+    matrix = matrix.astype(np.int8)
+
+    try:
+        simpan_matrix(id_kelas, id_bank_soal, versi, {'bobot': id_bobot, 'siswa': id_siswa, 'matrix': matrix})
+    except OSError as e:
+        app.logger.warning('Cannot store response matrix: %s', e)
+
+    return id_bobot, id_siswa, matrix
+
+
+def bulatkan(values):
+    import numpy as np
+
+    return np.array([float("{:.2f}".format(x)) for x in values])
+
+
+# Hitung b, a, l, el, p for every soal in the matrix
+# skor is the total score of every siswa column, for a matrix that holds
+# only some of the soal of the bank
+def hitung_bobot(matrix, skor=None):
+    import numpy as np
+
+    jumlah_siswa = matrix.shape[1]
+
+    # The 'Jumlah' column (benar per soal) is ranked together with the siswa,
+    # exactly like the score table used to be
+    tabel = np.hstack([matrix, matrix.sum(axis=1, keepdims=True)])
+
+    if skor is None:
+        total = tabel.sum(axis=0)
+    else:
+        total = np.append(skor, skor.sum())
+
+    urutan = np.argsort(total, kind='quicksort')
+
+    jumlah_per_kelompok = round(jumlah_siswa * 0.27)
+    kelompok_awal = urutan[:jumlah_per_kelompok]
+    kelompok_akhir = urutan[len(urutan) - jumlah_per_kelompok - 1:-1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b = (matrix == 1).sum(axis=1) / jumlah_siswa
+        a = (tabel[:, kelompok_akhir].sum(axis=1) / len(kelompok_akhir)
+             - tabel[:, kelompok_awal].sum(axis=1) / len(kelompok_awal))
+
+    b = bulatkan(b)
+    a = bulatkan(a)
+
+    return (b, a) + turunan_bobot(b, a)
+
+
+# Hitung l, el, p from the rounded b and a
+def turunan_bobot(b, a):
+    import numpy as np
+
+    l = a * (2 - b)
+    el = np.exp(l)
+    p = 1 / (1 + el)
+
+    return bulatkan(l), bulatkan(el), bulatkan(p)
+
+
+# Fit 2PL IRT b (difficulty) and a (discrimination) for every soal at once
+# Marginal maximum likelihood by EM over a fixed Gauss-Hermite grid of the
+# ability: the E-step is two matrix products over siswa x titik, the M-step
+# one Newton step per EM cycle for all soal together. Weak normal priors on
+# a and the intercept keep soal that everybody (or nobody) answered right
+# finite. b and a are clipped to the [-3, 3] range of the routing rules.
+# b and a are stored with two decimals, so the fit stops once no Newton
+# step moves a parameter by tol or more, and after max_iter cycles at most.
+def hitung_bobot_irt(matrix, titik=21, max_iter=150, tol=1e-3):
+    import numpy as np
+
+    start = time.perf_counter()
+    x = np.asarray(matrix, dtype=np.float64).T
+    jumlah_siswa, jumlah_soal = x.shape
+
+    theta, bobot_titik = np.polynomial.hermite_e.hermegauss(titik)
+    log_prior = np.log(bobot_titik / bobot_titik.sum())
+
+    proporsi = (x.sum(axis=0) + 0.5) / (jumlah_siswa + 1)
+    a = np.ones(jumlah_soal)
+    d = np.log(proporsi / (1 - proporsi))
+
+    log_likelihood = 0.0
+    perubahan = 0.0
+    konvergen = False
+
+    for iterasi in range(1, max_iter + 1):
+        z = theta[:, None] * a + d
+        log_benar = -np.logaddexp(0, -z)
+        log_salah = -np.logaddexp(0, z)
+
+        # E-step: posterior of every siswa over the grid
+        log_post = x @ (log_benar - log_salah).T + log_salah.sum(axis=1) + log_prior
+        maks = log_post.max(axis=1, keepdims=True)
+        post = np.exp(log_post - maks)
+        total = post.sum(axis=1, keepdims=True)
+        log_likelihood = float((maks + np.log(total)).sum())
+        post /= total
+
+        n = post.sum(axis=0)[:, None]
+        r = post.T @ x
+
+        # M-step: Newton step on (a, d) with priors a ~ N(1, 1), d ~ N(0, 3)
+        benar = np.exp(log_benar)
+        sisa = r - n * benar
+        w = n * benar * (1 - benar)
+
+        g_a = theta @ sisa - (a - 1)
+        g_d = sisa.sum(axis=0) - d / 9
+        i_aa = (theta ** 2) @ w + 1
+        i_ad = theta @ w
+        i_dd = w.sum(axis=0) + 1 / 9
+        det = i_aa * i_dd - i_ad ** 2
+
+        langkah_a = np.clip((i_dd * g_a - i_ad * g_d) / det, -1, 1)
+        langkah_d = np.clip((i_aa * g_d - i_ad * g_a) / det, -1, 1)
+        a += langkah_a
+        d += langkah_d
+
+        perubahan = float(max(np.abs(langkah_a).max(initial=0), np.abs(langkah_d).max(initial=0)))
+        if perubahan < tol:
+            konvergen = True
+            break
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b = -d / a
+
+    dipotong = int((~(np.abs(b) <= 3)).sum() + (np.abs(a) > 3).sum())
+    b = bulatkan(np.clip(np.nan_to_num(b), -3, 3) + 0.0)
+    a = bulatkan(np.clip(a, -3, 3))
+
+    diagnostik = {
+        'iterasi': iterasi,
+        'konvergen': konvergen,
+        'perubahan_maks': perubahan,
+        'log_likelihood': log_likelihood,
+        'titik_kuadratur': titik,
+        'dipotong': dipotong,
+        'waktu_ms': (time.perf_counter() - start) * 1000,
+    }
+
+    return (b, a) + turunan_bobot(b, a) + (diagnostik,)
+
+
+metode_kalibrasi = ('klasik', 'irt')
+
+
+# Hitung and store b, a, l, el, p of one kelas; the routing table is
+# rebuilt lazily by whoever serves the next request
+# metode is 'klasik' (27% method) or 'irt' (2PL fit, see hitung_bobot_irt)
+def kalibrasi_bobot(id_kelas, id_bank_soal, metode='klasik'):
+    id_bobot, id_siswa, matrix = get_matrix_hasil_manual(id_kelas, id_bank_soal)
+    hasil = {'jumlah_soal': len(id_bobot), 'jumlah_siswa': len(id_siswa)}
+
+    if metode == 'irt':
+        b, a, l, el, p, hasil['diagnostik'] = hitung_bobot_irt(matrix)
+    else:
+        b, a, l, el, p = hitung_bobot(matrix)
+
+    db.session.bulk_update_mappings(Bobot, [
+        {'id': id, 'b': b_i, 'a': a_i, 'l': l_i, 'el': el_i, 'p': p_i, 'metode': metode}
+        for id, b_i, a_i, l_i, el_i, p_i in zip(
+            id_bobot.tolist(), b.tolist(), a.tolist(), l.tolist(), el.tolist(), p.tolist())
+    ])
+    invalidate_bobot(id_kelas, id_bank_soal)
+    db.session.commit()
+
+    return hasil
+
+
+# Recalibrate one soal after its Hasil Manual changed
+# The soal row is read on its own and the siswa are ranked on the running
+# totals in skor_siswa (migration 0008), so b and a of this soal match a
+# full generate_bobot. Other soal keep their values until the next full
+# run, even if a siswa moved between the upper and lower groups.
+def kalibrasi_bobot_soal(id_kelas, id_soal, id_bank_soal):
+    import numpy as np
+
+    siswa = db.session.execute(
+        'SELECT id_siswa, skor FROM skor_siswa WHERE id_kelas = :id_kelas AND id_bank_soal = :id_bank_soal '
+        'ORDER BY urutan', {'id_kelas': id_kelas, 'id_bank_soal': id_bank_soal}).fetchall()
+
+    if not siswa:
+        return
+
+    status = dict(db.session.query(HasilManual.id_siswa, HasilManual.status).filter_by(
+        id_kelas=id_kelas, id_soal=id_soal, id_bank_soal=id_bank_soal))
+
+    matrix = np.array([[status.get(id_siswa) or 0 for id_siswa, skor in siswa]], dtype=np.int64)
+    skor = np.array([skor for id_siswa, skor in siswa], dtype=np.int64)
+    b, a, l, el, p = hitung_bobot(matrix, skor)
+
+    # A 2PL fit depends on the whole matrix, so soal calibrated with IRT keep
+    # their b and a until the next PUT /bobot/generate?metode=irt
+    Bobot.query.filter_by(id_kelas=id_kelas, id_soal=id_soal, id_bank_soal=id_bank_soal).filter(
+        db.or_(Bobot.metode.is_(None), Bobot.metode != 'irt')).update({
+        'b': b[0].item(), 'a': a[0].item(), 'l': l[0].item(), 'el': el[0].item(), 'p': p[0].item(),
+        'metode': 'klasik'},
+        synchronize_session=False)
+    invalidate_bobot(id_kelas, id_bank_soal)
+
+
 # Generate Bobot
 @app.route('/bobot/generate/<id_kelas>/<id_bank_soal>', methods=['PUT'])
 def generate_bobot(id_kelas, id_bank_soal):
+    metode = request.args.get('metode', 'klasik')
+
+    if metode not in metode_kalibrasi:
+        return jsonify({'message': 'metode must be klasik or irt'}), 400
+
+    hasil = kalibrasi_bobot(id_kelas, id_bank_soal, metode)
+    build_routing_bobot(id_kelas, id_bank_soal)
+
     bobot = Bobot.query.filter_by(
-        id_kelas=id_kelas, id_bank_soal=id_bank_soal)
+        id_kelas=id_kelas, id_bank_soal=id_bank_soal).order_by(Bobot.id)
     result = many_bobot_schema.dump(bobot)
 
-    index_i = 0
-    index_j = 0
-    array_i = []
-    array_j = []
-    index_id_soal = []
+    # The 2PL fit also reports how the solver converged
+    if metode == 'irt':
+        return jsonify({'bobot': result, 'diagnostik': hasil['diagnostik']})
 
-    total_siswa = 0
-   
+    return (jsonify(result))
 
-    for i in result:
-        hasil_manual = HasilManual.query.filter_by(
-            id_kelas=i['id_kelas'], id_soal=i['id_soal'], id_bank_soal=i['id_bank_soal'])
-        listHasilManual = many_hasil_manual_schema.dump(hasil_manual)
-        index_id_soal.append(i['id'])
 
-        jumlah_siswa = 0
-        jumlah_jawaban_benar = 0
-        jumlah_jawaban_salah = 0
+# K-means for the small (a, b) matrix of a bank soal
+# n_init seeded k-means++ starts, plus the centroids of the previous
+# labelling when every cluster has members, run through Lloyd together as
+# one batch; the start with the lowest inertia wins, and the previous
+# labelling is kept on a tie.
+def kmeans(points, jumlah_cluster=3, labels=None, n_init=10, max_iter=300, tol=1e-4, seed=0):
+    import numpy as np
 
-        array_j = []
+    points = np.asarray(points, dtype=np.float64)
+    jumlah_cluster = min(jumlah_cluster, len(points))
+    random = np.random.RandomState(seed)
+    semua = np.arange(n_init)
 
-        for j in listHasilManual:
-            array_j.append(j['status'])
-            jumlah_siswa = jumlah_siswa + 1
-            if (j['status'] == 1):
-                jumlah_jawaban_benar = jumlah_jawaban_benar + 1
-            else:
-                jumlah_jawaban_salah = jumlah_jawaban_salah + 1
-        
-        array_i.append(array_j)
+    # Squared distances as |x|^2 - 2 x.c + |c|^2: matrix products instead of
+    # sums over the two coordinates
+    kuadrat = (points ** 2).sum(axis=1)
+    antar_titik = np.maximum(kuadrat[:, None] - 2 * points @ points.T + kuadrat[None, :], 0)
+    titik_satu = np.hstack([points, np.ones((len(points), 1))])
 
-        b = jumlah_jawaban_benar / jumlah_siswa
-        total_siswa = jumlah_siswa
+    # Greedy k-means++ for every start at once: each step samples a few
+    # candidates in proportion to the distance and keeps the one that
+    # lowers the potential the most
+    def kmeans_plus_plus():
+        percobaan = 2 + int(np.log(jumlah_cluster))
+        pilihan = [random.randint(len(points), size=n_init)]
+        jarak = antar_titik[pilihan[0]]
 
-        new_hasil_manual = Bobot.query.get(i['id'])
-        new_hasil_manual.b = float("{:.2f}".format(b))
-        db.session.commit()
+        for _ in range(1, jumlah_cluster):
+            total = jarak.sum(axis=1)
+            batas = np.cumsum(jarak, axis=1)
+            acak = random.random_sample((n_init, percobaan)) * total[:, None]
+            kandidat = np.minimum((batas[:, None, :] <= acak[:, :, None]).sum(axis=2), len(points) - 1)
 
-    new_list = np.array(array_i)
-    new_df = pd.DataFrame(data=new_list, index=index_id_soal)
-    new_df['Jumlah'] = new_df.sum(axis=1)
-    new_df = new_df.T
-    new_df['Total'] = new_df.sum(axis=1)
-    new_df = new_df.sort_values(by=['Total'])
+            nol = total == 0
+            kandidat[nol] = random.randint(len(points), size=(nol.sum(), percobaan))
 
-    jumlah_soal = len(new_df)
-    jumlah_per_kelompok = round(total_siswa * 0.27)
+            jarak_kandidat = np.minimum(jarak[:, None, :], antar_titik[kandidat])
+            terbaik = jarak_kandidat.sum(axis=2).argmin(axis=1)
 
-    kelompok_awal = new_df[:jumlah_per_kelompok]
-    kelompok_akhir = new_df[jumlah_soal-jumlah_per_kelompok - 1: - 1]
-    jumlah = new_df[-1:]
+            pilihan.append(kandidat[semua, terbaik])
+            jarak = jarak_kandidat[semua, terbaik]
 
-    kelompok_awal_sum = pd.DataFrame(data=kelompok_awal.sum(axis=0))
-    kelompok_akhir_sum = pd.DataFrame(data=kelompok_akhir.sum(axis=0))
-    jumlah = jumlah.T
+        return points[np.stack(pilihan, axis=1)]
 
-    jumlah_kelompok_awal = kelompok_awal.shape[0]
-    jumlah_kelompok_akhir = kelompok_akhir.shape[0]
+    # Shape (start, cluster, titik)
+    def jarak_pusat(pusat):
+        return (pusat ** 2 @ np.ones(points.shape[1]))[:, :, None] - 2 * pusat @ points.T + kuadrat
 
-    kelompok_awal_sum = kelompok_awal_sum.drop(['Total'])
+    # Lloyd on a batch of starts, shape (start, cluster, dimension)
+    def lloyd(pusat):
+        for _ in range(max_iter):
+            anggota = jarak_pusat(pusat).argmin(axis=1)[:, None, :] == np.arange(jumlah_cluster)[:, None]
+            jumlah = anggota @ titik_satu
+            baru = jumlah[:, :, :-1] / np.maximum(jumlah[:, :, -1:], 1)
 
+            # An empty cluster keeps its centroid
+            baru = np.where(jumlah[:, :, -1:] > 0, baru, pusat)
 
-    for index, row in kelompok_awal_sum.iterrows():
-        a = kelompok_akhir_sum.loc[ index , : ].values
-        b = row.values
+            geser = ((baru - pusat) ** 2).reshape(len(pusat), -1) @ np.ones(pusat[0].size)
+            pusat = baru
 
-        b = b / jumlah_kelompok_awal
-        a = a / jumlah_kelompok_akhir
-        dp = a - b
+            if (geser <= tol).all():
+                break
 
+        jarak = np.maximum(jarak_pusat(pusat), 0)
 
-        new_hasil_manual = Bobot.query.get(index)
-        new_hasil_manual.a = float("{:.2f}".format(dp.item(0)))
-        db.session.commit()
-        
-        
-    bobot = Bobot.query.filter_by(
-        id_kelas=id_kelas, id_bank_soal=id_bank_soal)
-    result = many_bobot_schema.dump(bobot)
+        return jarak.argmin(axis=1), pusat, jarak.min(axis=1).sum(axis=1)
 
-    daftar_bobot = pd.DataFrame(result)
+    awal = kmeans_plus_plus()
+    hangat = labels is not None and len(labels) == len(points) \
+        and set(np.asarray(labels).tolist()) == set(range(jumlah_cluster))
 
-    daftar_bobot['l'] = daftar_bobot.apply(lambda x: x['a']*(2-x['b']), axis = 1)
-    daftar_bobot['el'] = daftar_bobot.apply(lambda x: math.exp(x['l']), axis = 1)
-    daftar_bobot['p'] = daftar_bobot.apply(lambda x: 1 / (1 + x['el']), axis = 1)
+    if hangat:
+        labels = np.asarray(labels)
+        pusat = np.array([points[labels == i].mean(axis=0) for i in range(jumlah_cluster)])
+        awal = np.concatenate([pusat[None], awal])
 
-    for index, row in daftar_bobot.iterrows():
-        l = row['l']
-        el = row['el']
-        p = row['p']
-        id = row['id']
+    hasil, pusat, inersia = lloyd(awal)
+    best = int(inersia.argmin())
 
-        new_hasil_manual = Bobot.query.get(id)
-        new_hasil_manual.l = float("{:.2f}".format(l))
-        new_hasil_manual.el = float("{:.2f}".format(el))
-        new_hasil_manual.p = float("{:.2f}".format(p))
-        db.session.commit()
+    if hangat and inersia[0] <= inersia[best] + 1e-12 * max(1.0, inersia[best]):
+        best = 0
 
+    return hasil[best], pusat[best]
 
-    bobot = Bobot.query.filter_by(
-        id_kelas=id_kelas, id_bank_soal=id_bank_soal)
-    result = many_bobot_schema.dump(bobot)
-    
-    return (jsonify(result))
+
+# Renumber clusters by b (proportion benar): 0 = mudah, 1 = sedang, 2 = susah
+# b_sulit is for IRT b (difficulty), where mudah has the lowest b
+def urutkan_cluster(labels, centroids, b_sulit=False):
+    import numpy as np
+
+    urutan = np.argsort(centroids[:, 1] if b_sulit else -centroids[:, 1], kind='stable')
+    posisi = np.empty_like(urutan)
+    posisi[urutan] = np.arange(len(urutan))
+
+    return posisi[labels], centroids[urutan]
+
+
+# Cluster the soal of one kelas by (a, b) and store the labels
+def cluster_bobot(id_kelas, id_bank_soal):
+    import numpy as np
+
+    bobot = db.session.query(Bobot.id, Bobot.a, Bobot.b, Bobot.cluster, Bobot.metode).filter_by(
+        id_kelas=id_kelas, id_bank_soal=id_bank_soal).order_by(Bobot.id).all()
+    jumlah = [0, 0, 0]
+
+    # b of IRT rows and of klasik rows (metode NULL included) are on
+    # different scales; once one row is IRT the bank soal is on that scale,
+    # and rows on the other scale are left out like uncalibrated rows (no a
+    # or b yet) and get no cluster
+    metode = 'irt' if any(row[4] == 'irt' for row in bobot) else 'klasik'
+    dipakai = [row[1] is not None and row[2] is not None and (row[4] or 'klasik') == metode for row in bobot]
+    kosong = [row for row, pakai in zip(bobot, dipakai) if not pakai]
+    bobot = [row for row, pakai in zip(bobot, dipakai) if pakai]
+
+    perubahan = [{'id': row[0], 'cluster': None} for row in kosong if row[3] is not None]
+
+    if bobot:
+        id_bobot = [row[0] for row in bobot]
+        points = np.array([(row[1], row[2]) for row in bobot], dtype=np.float64)
+        lama = np.array([-1 if row[3] is None else row[3] for row in bobot], dtype=np.int64)
+
+        # The previous labels are the warm start. With IRT b is the
+        # difficulty, so the easy cluster has the lowest b
+        labels, centroids = urutkan_cluster(*kmeans(points, 3, lama), b_sulit=metode == 'irt')
+        jumlah = np.bincount(labels, minlength=3).tolist()
+
+        perubahan += [
+            {'id': id, 'cluster': label}
+            for id, label, cluster_lama in zip(id_bobot, labels.tolist(), lama.tolist())
+            if label != cluster_lama
+        ]
+
+    # Unchanged labels leave the cached routing of every worker valid
+    if perubahan:
+        db.session.bulk_update_mappings(Bobot, perubahan)
+        invalidate_bobot(id_kelas, id_bank_soal)
+
+    db.session.commit()
+
+    return {'cluster': jumlah}
 
 
 # Cluster
 @app.route('/cluster/<id_kelas>/<id_bank_soal>', methods=['PUT'])
 def cluster(id_kelas, id_bank_soal):
-    bobot = Bobot.query.filter_by(
-        id_kelas=id_kelas, id_bank_soal=id_bank_soal).order_by(Bobot.a)
-    result = many_bobot_schema.dump(bobot)
+    cluster_bobot(id_kelas, id_bank_soal)
+    build_routing_bobot(id_kelas, id_bank_soal)
+
+    return jsonify(dump_bobot(id_kelas, id_bank_soal))
+
 
-    array = []
+# Model Job
+# Background analytics runs. id_kelas and hasil hold JSON; status goes
+# menunggu -> berjalan -> selesai | gagal, selesai counts finished kelas.
+# pid owns the job and detak is the time of its last progress.
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    jenis = db.Column(db.String(50))
+    id_bank_soal = db.Column(db.Integer)
+    id_kelas = db.Column(db.Text)
+    status = db.Column(db.String(20), index=True)
+    total = db.Column(db.Integer)
+    selesai = db.Column(db.Integer)
+    hasil = db.Column(db.Text)
+    error = db.Column(db.Text)
+    dibuat = db.Column(db.Float)
+    mulai = db.Column(db.Float)
+    berakhir = db.Column(db.Float)
+    pid = db.Column(db.Integer)
+    detak = db.Column(db.Float)
+
+    def __init__(self, jenis, id_bank_soal, id_kelas):
+        self.jenis = jenis
+        self.id_bank_soal = id_bank_soal
+        self.id_kelas = json.dumps(id_kelas)
+        self.status = 'menunggu'
+        self.total = len(id_kelas)
+        self.selesai = 0
+        self.hasil = '[]'
+        self.dibuat = time.time()
+        self.pid = os.getpid()
+        self.detak = self.dibuat
 
-    for i in result:
-        array.append([i["a"], i["b"]])
 
-    np_array = np.array(array)
+# Schema Job
+class JobSchema(ma.Schema):
+    id_kelas = ma.Function(lambda job: json.loads(job.id_kelas))
+    hasil = ma.Function(lambda job: json.loads(job.hasil or '[]'))
+
+    class Meta:
+        fields = ('id', 'jenis', 'id_bank_soal', 'id_kelas', 'status', 'total', 'selesai',
+                  'hasil', 'error', 'dibuat', 'mulai', 'berakhir', 'detak')
+
 
-    kmeans = KMeans(n_clusters=3, random_state=0).fit(np_array)
+# Init Schema Job
+job_schema = JobSchema()
 
-    index = 0
+# Process pool for jobs, created on first use in every worker process.
+# Children are forked from the web worker, so they start with its app and
+# models but must not reuse its SQLite connections.
+job_executor = {'pid': None, 'executor': None}
 
-    for data in result:
-        new_data = Bobot.query.get(data["id"])
-        new_data.cluster = kmeans.labels_[index].item()
+
+def init_job_process():
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def get_job_executor():
+    if job_executor['pid'] != os.getpid():
+        job_executor['executor'] = ProcessPoolExecutor(
+            max_workers=app.config['JOB_WORKERS'], mp_context=multiprocessing.get_context('fork'),
+            initializer=init_job_process)
+        job_executor['pid'] = os.getpid()
+
+    return job_executor['executor']
+
+
+# Recalibrate: kalibrasi_bobot + cluster_bobot for every kelas, one commit
+# per kelas so GET /jobs/<id> can follow the progress
+def run_job(id):
+    with app.app_context():
+        # Only a job still waiting is started; one that expire_jobs already
+        # failed while it sat in the queue stays failed
+        mulai = time.time()
+        diambil = Job.query.filter_by(id=id, status='menunggu').update(
+            {'status': 'berjalan', 'mulai': mulai, 'pid': os.getpid(), 'detak': mulai},
+            synchronize_session=False)
         db.session.commit()
-        index = index + 1
 
-    bobot = Bobot.query.filter_by(
-        id_kelas=id_kelas, id_bank_soal=id_bank_soal)
-    result = many_bobot_schema.dump(bobot)
+        if not diambil:
+            db.session.remove()
+            return
 
-    return (jsonify(result))
+        job = Job.query.get(id)
+        hasil = []
+
+        try:
+            for id_kelas in json.loads(job.id_kelas):
+                item = {'id_kelas': id_kelas}
+                item.update(kalibrasi_bobot(id_kelas, job.id_bank_soal))
+                item.update(cluster_bobot(id_kelas, job.id_bank_soal))
+                hasil.append(item)
+
+                job.selesai = len(hasil)
+                job.hasil = json.dumps(hasil)
+                job.detak = time.time()
+                db.session.commit()
+
+            job.status = 'selesai'
+        except Exception as e:
+            db.session.rollback()
+            job.status = 'gagal'
+            job.error = '%s: %s' % (type(e).__name__, e)
+
+        job.berakhir = time.time()
+        db.session.commit()
+        db.session.remove()
+
+
+# Fail waiting or running jobs whose process is gone (a killed or recycled
+# worker takes its pool with it), and running jobs that made no progress
+# for JOB_TIMEOUT; a job queued behind others in a busy pool is not stalled.
+# Runs at startup and whenever a job is read.
+def expire_jobs(*id):
+    now = time.time()
+    jobs = Job.query.filter(Job.status.in_(('menunggu', 'berjalan')))
+
+    if id:
+        jobs = jobs.filter(Job.id.in_(id))
+
+    for job in jobs:
+        if job.pid is not None and not proses_hidup(job.pid):
+            job.error = 'proses %d berhenti sebelum job selesai' % job.pid
+        elif job.status == 'berjalan' and (job.detak or job.dibuat) < now - app.config['JOB_TIMEOUT']:
+            job.error = 'tidak ada progres selama %d detik' % app.config['JOB_TIMEOUT']
+        else:
+            continue
+
+        job.status = 'gagal'
+        job.berakhir = now
+
+    db.session.commit()
+
+
+# Create Recalibrate Job
+# Body: {"id_kelas": [...]}, defaults to every kelas with Bobot for the bank soal
+@app.route('/jobs/recalibrate/<id_bank_soal>', methods=['POST'])
+def add_recalibrate_job(id_bank_soal):
+    id_bank_soal = ke_int(id_bank_soal)
+    body = request.get_json(silent=True)
+    id_kelas = body.get('id_kelas') if isinstance(body, dict) else None
+
+    if id_bank_soal is None:
+        return jsonify({'message': 'id_bank_soal must be an integer'}), 400
+
+    if id_kelas is None:
+        id_kelas = [k for (k,) in db.session.query(Bobot.id_kelas).filter_by(
+            id_bank_soal=id_bank_soal).distinct().order_by(Bobot.id_kelas)]
+
+    if not isinstance(id_kelas, list) or any(ke_int(k) is None for k in id_kelas):
+        return jsonify({'message': 'id_kelas must be a list of integers'}), 400
+
+    job = Job('recalibrate', id_bank_soal, [ke_int(k) for k in id_kelas])
+    db.session.add(job)
+    db.session.commit()
+
+    try:
+        get_job_executor().submit(run_job, job.id)
+    except Exception as e:
+        job.status = 'gagal'
+        job.error = '%s: %s' % (type(e).__name__, e)
+        db.session.commit()
+
+    return job_schema.jsonify(job), 202
+
+# Get Job
+@app.route('/jobs/<id>', methods=['GET'])
+def get_job(id):
+    id = ke_int(id)
+    job = None
+
+    if id is not None:
+        expire_jobs(id)
+        job = Job.query.get(id)
+
+    if job is None:
+        return jsonify({'message': 'job not found'}), 404
+
+    return job_schema.jsonify(job)
+
+
+# Model Cache Version
+# One row per cached object that was written ('soal:<id>', 'bank_soal:<id>',
+# 'bobot:<id_kelas>:<id_bank_soal>'). versi is the value of the 'global'
+# counter at the last write, so a worker only reads the rows newer than
+# the counter it saw last.
+class CacheVersion(db.Model):
+    nama = db.Column(db.String(100), primary_key=True)
+    versi = db.Column(db.Integer, nullable=False, index=True)
+
+
+versi_cache = {'global': None, 'checked': 0}
+
+
+# Drop the local cache entries of one written object
+def apply_versi(nama):
+    jenis, _, key = nama.partition(':')
+
+    if jenis == 'soal':
+        cache_soal.pop_where(lambda k: k[1] == int(key))
+    elif jenis == 'bank_soal':
+        cache_bank_soal.pop(int(key))
+    elif jenis == 'bobot':
+        drop_routing_bobot(*key.split(':'))
+    elif jenis == 'token':
+        drop_token_value(int(key))
+
+
+def bump_versi(*nama):
+    db.session.execute("UPDATE cache_version SET versi = versi + 1 WHERE nama = 'global'")
+    db.session.execute('INSERT OR IGNORE INTO cache_version (nama, versi) VALUES (:nama, 0)',
+                       [{'nama': n} for n in nama])
+    db.session.execute("UPDATE cache_version SET versi = (SELECT versi FROM cache_version WHERE nama = 'global') "
+                       'WHERE nama = :nama', [{'nama': n} for n in nama])
+
+
+# Bump the shared version and drop the local entries; the commit is left
+# to the caller
+def invalidate(*nama):
+    if not nama:
+        return
+
+    bump_versi(*nama)
+
+    for n in nama:
+        apply_versi(n)
+
+
+# Drop entries other workers have written since the last check
+@app.before_request
+def check_cache_version():
+    now = time.monotonic()
+
+    if now - versi_cache['checked'] < app.config['CACHE_VERSION_INTERVAL']:
+        return
+
+    versi_cache['checked'] = now
+    versi = db.session.query(CacheVersion.versi).filter_by(nama='global').scalar()
+
+    if versi_cache['global'] is not None and versi != versi_cache['global']:
+        changed = db.session.query(CacheVersion.nama).filter(
+            CacheVersion.versi > versi_cache['global'], CacheVersion.nama != 'global')
+
+        for (nama,) in changed:
+            apply_versi(nama)
+
+    versi_cache['global'] = versi
+
+
+# Migrations
+# Every migrations/NNNN_name.sql file is applied once, in order, inside its
+# own transaction; the applied version is kept in PRAGMA user_version.
+migrations_dir = os.path.join(basedir, 'migrations')
+
+
+def list_migrations():
+    migrations = []
+
+    for nama in sorted(os.listdir(migrations_dir)):
+        if nama.endswith('.sql'):
+            migrations.append((int(nama.split('_', 1)[0]), nama))
+
+    return migrations
+
+
+def split_sql(script):
+    statements = []
+    statement = ''
+
+    for line in script.splitlines(True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            statements.append(statement.strip())
+            statement = ''
+
+    return statements
+
+
+def migrate():
+    applied = []
+    connection = db.engine.raw_connection()
+
+    try:
+        conn = connection.connection
+        isolation_level = conn.isolation_level
+        conn.isolation_level = None
+
+        try:
+            for versi, nama in list_migrations():
+                conn.execute('BEGIN IMMEDIATE')
+
+                try:
+                    if conn.execute('PRAGMA user_version').fetchone()[0] >= versi:
+                        conn.execute('ROLLBACK')
+                        continue
+
+                    with open(os.path.join(migrations_dir, nama)) as f:
+                        for statement in split_sql(f.read()):
+                            conn.execute(statement)
+
+                    conn.execute('PRAGMA user_version = %d' % versi)
+                    conn.execute('COMMIT')
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    raise
+
+                applied.append(nama)
+        finally:
+            conn.isolation_level = isolation_level
+    finally:
+        connection.close()
+
+    return applied
+
+
+@app.cli.command('migrate')
+def migrate_command():
+    for nama in migrate():
+        print('Applied ' + nama)
 
 
 # Contoh CSV
@@ -1417,10 +3388,18 @@ def test():
     return jsonify(result)
 
 def getApp():
+    migrate()
+
+    with app.app_context():
+        expire_jobs()
+
+    prune_metrics()
+
     return app
 
 # Run Server
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 8000))
+    getApp()
     # app.run(host='0.0.0.0', port=port)
     app.run(debug=True, port=port)
@@ -0,0 +1,6 @@
+# Benchmarks for the API, run from the repository root:
+#   python -m benchmark.sqlite_stress
+#   python -m benchmark.startup
+#   python -m benchmark.synthetic --database /tmp/school.sqlite3
+#   python -m benchmark.endpoints --output result.json
+#   python -m benchmark.irt --siswa 1000 --soal 200
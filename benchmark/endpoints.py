@@ -0,0 +1,186 @@
+# Latency benchmark for the hot endpoints
+#
+# Generates a synthetic school (see benchmark.synthetic) unless --database
+# points at an existing one, then calls every endpoint --runs times through
+# the Flask test client and reports p50/p95/p99 latency and the number of
+# SQL statements per call. Write the result with --output and compare two
+# files to spot regressions.
+#
+#   python -m benchmark.endpoints --runs 200 --output before.json
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+from benchmark.sqlite_stress import load_app, root
+from benchmark import synthetic
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = (len(values) - 1) * p / 100.0
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
+# (name, method, url, json body) for one call of every endpoint
+def build_calls(acak, data):
+    id_kelas = acak.choice(data['kelas'])
+    id_bank_soal = acak.choice(data['bank_soal'])
+    id_soal = acak.choice(data['soal'][id_bank_soal])
+    nis, password, id_siswa = acak.choice(data['siswa'])
+    next_soal, status = acak.choice(data['next'][(id_kelas, id_bank_soal)])
+
+    return [
+        ('auth_siswa', 'post', '/auth/siswa', {'nis': nis, 'password': password}),
+        ('get_next_soal', 'get', '/bobot/next-soal/%d/%d/%d/%d/0/0/0' % (id_kelas, id_bank_soal, next_soal, status), None),
+        ('add_jawaban', 'post', '/jawaban', {
+            'id_siswa': id_siswa, 'id_ujian': 1, 'id_soal': id_soal, 'jawaban': 'a', 'kunci': 'a',
+            'analisis': 'Sudah benar', 'keterangan': 'Sudah benar', 'status': 1, 'pertanyaan': 'benchmark'}),
+        ('generate_bobot', 'put', '/bobot/generate/%d/%d' % (id_kelas, id_bank_soal), None),
+        ('cluster', 'put', '/cluster/%d/%d' % (id_kelas, id_bank_soal), None),
+        ('sync_hasil_manual_by_id_kelas', 'post', '/hasil-manual/sync/%d/%d/%d' % (id_kelas, id_soal, id_bank_soal), None),
+        ('get_soal_by_bank_pilihan', 'get', '/soal/bank-soal/%d' % id_bank_soal, None),
+    ]
+
+
+def load_data(client):
+    from __init__ import db, Siswa, Soal, Bobot, get_routing_bobot
+
+    data = {'kelas': [], 'bank_soal': [], 'soal': {}, 'next': {}}
+    data['siswa'] = db.session.query(Siswa.nis, Siswa.password, Siswa.id).all()
+
+    for id_soal, id_bank_soal in db.session.query(Soal.id, Soal.id_bank_soal):
+        data['soal'].setdefault(id_bank_soal, []).append(id_soal)
+
+    pasangan = db.session.query(Bobot.id_kelas, Bobot.id_bank_soal).distinct().all()
+    data['kelas'] = sorted({k for k, b in pasangan})
+    data['bank_soal'] = sorted({b for k, b in pasangan})
+
+    # Calibrate and cluster once so the routing tables exist, then keep the
+    # (id_soal, status) pairs whose next cluster has a soal at index 0
+    for id_kelas in data['kelas']:
+        for id_bank_soal in data['bank_soal']:
+            client.put('/bobot/generate/%d/%d' % (id_kelas, id_bank_soal))
+            client.put('/cluster/%d/%d' % (id_kelas, id_bank_soal))
+
+            routing = get_routing_bobot(id_kelas, id_bank_soal)
+            data['next'][(id_kelas, id_bank_soal)] = [
+                (id_soal, status) for id_soal, hasil in routing['next'].items()
+                for status in (0, 1) if routing['cluster'][hasil[status][1]]]
+
+    return data
+
+
+def run(app, runs, seed):
+    from __init__ import db
+    from sqlalchemy import event
+
+    acak = random.Random(seed)
+    client = app.test_client()
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+
+    with app.app_context():
+        data = load_data(client)
+        event.listen(db.engine, 'before_cursor_execute', count)
+
+    hasil = {}
+
+    try:
+        for _ in range(runs):
+            for name, method, url, body in build_calls(acak, data):
+                statements[0] = 0
+                start = time.perf_counter()
+                response = getattr(client, method)(url, json=body)
+                waktu = time.perf_counter() - start
+
+                item = hasil.setdefault(name, {'latency': [], 'sql': [], 'errors': 0})
+                item['latency'].append(waktu * 1000)
+                item['sql'].append(statements[0])
+                item['errors'] += response.status_code != 200
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', count)
+
+    return {name: {
+        'calls': len(item['latency']),
+        'errors': item['errors'],
+        'p50_ms': percentile(item['latency'], 50),
+        'p95_ms': percentile(item['latency'], 95),
+        'p99_ms': percentile(item['latency'], 99),
+        'mean_ms': sum(item['latency']) / len(item['latency']),
+        'sql_per_call': sum(item['sql']) / len(item['sql']),
+        'sql_max': max(item['sql']),
+    } for name, item in hasil.items()}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=root,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', help='existing database to copy instead of a synthetic one')
+    parser.add_argument('--profile', default='production')
+    parser.add_argument('--runs', type=int, default=100)
+    parser.add_argument('--kelas', type=int, default=10)
+    parser.add_argument('--siswa', type=int, default=32)
+    parser.add_argument('--bank', type=int, default=5)
+    parser.add_argument('--soal', type=int, default=50)
+    parser.add_argument('--pilihan', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    database = os.path.join(directory, 'db.sqlite3')
+
+    try:
+        if args.database:
+            shutil.copy(args.database, database)
+
+        app = load_app(database, args.profile)
+
+        if not args.database:
+            with app.app_context():
+                dataset = synthetic.generate(args.kelas, args.siswa, args.bank, args.soal, args.pilihan, args.seed)
+        else:
+            dataset = {'database': args.database}
+
+        endpoints = run(app, args.runs, args.seed)
+    finally:
+        shutil.rmtree(directory)
+
+    for name, item in endpoints.items():
+        print('%-30s p50 %7.2f  p95 %7.2f  p99 %7.2f ms  sql %5.1f  errors %d' % (
+            name, item['p50_ms'], item['p95_ms'], item['p99_ms'], item['sql_per_call'], item['errors']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'profile': args.profile,
+                'runs': args.runs,
+                'seed': args.seed,
+                'dataset': dataset,
+                'endpoints': endpoints,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# 2PL calibration benchmark: time of hitung_bobot_irt on simulated answers
+#
+# Draws a seeded 2PL response matrix (ability per siswa, difficulty and
+# discrimination per soal), fits it --runs times and reports the median
+# wall time, the EM iterations and how well b and a are recovered.
+#
+#   python -m benchmark.irt --siswa 1000 --soal 200 --runs 5
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark.sqlite_stress import load_app
+
+
+# Soal x siswa matrix of 0/1 answers, with the true b and a
+def simulate(siswa, soal, seed):
+    acak = np.random.RandomState(seed)
+    theta = acak.normal(size=siswa)
+    b = acak.normal(size=soal)
+    a = acak.uniform(0.5, 2.0, size=soal)
+
+    peluang = 1 / (1 + np.exp(-a[:, None] * (theta[None, :] - b[:, None])))
+
+    return (acak.uniform(size=peluang.shape) < peluang).astype(np.int8), b, a
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--siswa', type=int, default=1000)
+    parser.add_argument('--soal', type=int, default=200)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+
+    try:
+        load_app(os.path.join(directory, 'db.sqlite3'), 'production')
+        from __init__ import hitung_bobot_irt
+
+        matrix, b_asli, a_asli = simulate(args.siswa, args.soal, args.seed)
+        runs = []
+
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            b, a, l, el, p, diagnostik = hitung_bobot_irt(matrix)
+            runs.append((time.perf_counter() - start) * 1000)
+    finally:
+        shutil.rmtree(directory)
+
+    result = {
+        'siswa': args.siswa,
+        'soal': args.soal,
+        'seed': args.seed,
+        'runs_ms': runs,
+        'median_ms': statistics.median(runs),
+        'iterasi': diagnostik['iterasi'],
+        'konvergen': diagnostik['konvergen'],
+        'korelasi_b': float(np.corrcoef(b, b_asli)[0, 1]),
+        'korelasi_a': float(np.corrcoef(a, a_asli)[0, 1]),
+    }
+
+    print('%d siswa x %d soal: median %.1f ms  iterasi %d  konvergen %s  r(b) %.3f  r(a) %.3f' % (
+        args.siswa, args.soal, result['median_ms'], result['iterasi'], result['konvergen'],
+        result['korelasi_b'], result['korelasi_a']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# Concurrent read/write stress test for the SQLite engine profiles
+#
+# Every profile gets its own copy of db.sqlite3. Writer processes post
+# answers through POST /jawaban while reader processes fetch answers and
+# Hasil Manual rows, like a class taking an exam while the teacher works.
+#
+#   python -m benchmark.sqlite_stress --profiles legacy,production --seconds 10
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def load_app(database, profile):
+    os.environ['DATABASE_URI'] = 'sqlite:///' + database
+    os.environ['DB_PROFILE'] = profile
+    sys.path.insert(0, root)
+
+    from __init__ import getApp
+
+    return getApp()
+
+
+def worker(database, profile, jenis, nomor, seconds, start, queue):
+    app = load_app(database, profile)
+    client = app.test_client()
+    ok = 0
+    error = 0
+    latencies = []
+
+    start.wait()
+    end = time.monotonic() + seconds
+
+    while time.monotonic() < end:
+        begin = time.monotonic()
+
+        if jenis == 'write':
+            response = client.post('/jawaban', json={
+                'id_siswa': 1000 + nomor, 'id_ujian': 1000, 'id_soal': ok % 50,
+                'jawaban': 'a', 'kunci': 'a', 'analisis': 'Sudah benar',
+                'keterangan': 'Sudah benar', 'status': 1, 'pertanyaan': 'stress'})
+        elif ok % 2:
+            response = client.get('/jawaban/siswa/%d/1000' % (1000 + nomor))
+        else:
+            response = client.get('/hasil-manual/1/50/1')
+
+        latencies.append(time.monotonic() - begin)
+
+        if response.status_code == 200:
+            ok += 1
+        else:
+            error += 1
+
+    queue.put((jenis, ok, error, sum(latencies)))
+
+
+def run_profile(source, profile, writers, readers, seconds):
+    directory = tempfile.mkdtemp()
+    database = os.path.join(directory, 'db.sqlite3')
+    shutil.copy(source, database)
+
+    # Every process imports the app itself, like a gunicorn worker
+    context = multiprocessing.get_context('spawn')
+
+    # Migrate once before the workers start
+    migrate = context.Process(target=load_app, args=(database, profile))
+    migrate.start()
+    migrate.join()
+
+    start = context.Event()
+    queue = context.Queue()
+    processes = [context.Process(target=worker, args=(database, profile, jenis, nomor, seconds, start, queue))
+                 for jenis, count in (('write', writers), ('read', readers)) for nomor in range(count)]
+
+    for process in processes:
+        process.start()
+
+    # Let every worker finish importing before the clock starts
+    time.sleep(5)
+    start.set()
+
+    result = {'profile': profile, 'write': [0, 0, 0.0], 'read': [0, 0, 0.0]}
+
+    for _ in processes:
+        jenis, ok, error, waktu = queue.get()
+        result[jenis] = [a + b for a, b in zip(result[jenis], (ok, error, waktu))]
+
+    for process in processes:
+        process.join()
+
+    shutil.rmtree(directory)
+
+    return {
+        'profile': profile,
+        'writes_per_second': result['write'][0] / seconds,
+        'reads_per_second': result['read'][0] / seconds,
+        'write_errors': result['write'][1],
+        'read_errors': result['read'][1],
+        'mean_write_ms': 1000 * result['write'][2] / max(1, sum(result['write'][:2])),
+        'mean_read_ms': 1000 * result['read'][2] / max(1, sum(result['read'][:2])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', default=os.path.join(root, 'db.sqlite3'))
+    parser.add_argument('--profiles', default='legacy,production')
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    results = [run_profile(args.database, profile, args.writers, args.readers, args.seconds)
+               for profile in args.profiles.split(',')]
+
+    for result in results:
+        print('%(profile)-12s writes/s %(writes_per_second)8.1f  reads/s %(reads_per_second)8.1f  '
+              'errors %(write_errors)d/%(read_errors)d  mean ms %(mean_write_ms).1f/%(mean_read_ms).1f' % result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# Worker startup benchmark: import time and RSS of a fresh app process
+#
+# Every run starts a new interpreter that imports the app the way
+# wsgi.py does and reports how long that took, its peak RSS and which
+# analytics libraries ended up loaded.
+#
+#   python -m benchmark.startup --runs 5 --output startup.json
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+probe = '''
+import json, resource, sys, time
+start = time.perf_counter()
+sys.path.insert(0, %r)
+from __init__ import getApp
+getApp()
+elapsed = time.perf_counter() - start
+heavy = [m for m in ('numpy', 'pandas', 'sklearn', 'scipy', 'matplotlib') if m in sys.modules]
+print(json.dumps({'import_seconds': elapsed,
+                  'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+                  'heavy_modules': heavy}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', default=os.path.join(root, 'db.sqlite3'))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    database = os.path.join(directory, 'db.sqlite3')
+    shutil.copy(args.database, database)
+
+    env = dict(os.environ, DATABASE_URI='sqlite:///' + database)
+    runs = []
+
+    try:
+        for _ in range(args.runs):
+            output = subprocess.check_output([sys.executable, '-c', probe % root], env=env, cwd=root)
+            runs.append(json.loads(output.decode().strip().splitlines()[-1]))
+    finally:
+        shutil.rmtree(directory)
+
+    result = {
+        'runs': runs,
+        'import_seconds_median': statistics.median(run['import_seconds'] for run in runs),
+        'max_rss_mb_median': statistics.median(run['max_rss_mb'] for run in runs),
+        'heavy_modules': runs[-1]['heavy_modules'],
+    }
+
+    print('import %.3f s  rss %.1f MB  heavy modules: %s' % (
+        result['import_seconds_median'], result['max_rss_mb_median'], ', '.join(result['heavy_modules']) or '-'))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# Synthetic school generator
+#
+# Fills an empty database with gurus, kelas, siswa, bank soal, soal,
+# pilihan soal, one ujian per kelas and bank soal and the full answer
+# history of that ujian (Jawaban and Hasil Manual), plus the Bobot rows.
+# Answers follow a 2PL model (ability per siswa, difficulty and
+# discrimination per soal), so calibration and clustering get realistic
+# input instead of uniform noise.
+#
+#   python -m benchmark.synthetic --database /tmp/school.sqlite3 --kelas 20 --siswa 35
+import argparse
+import math
+import os
+import random
+import time
+
+from benchmark.sqlite_stress import load_app
+
+chunk_size = 5000
+
+
+def insert(db, model, rows):
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(model.__table__.insert(), rows[start:start + chunk_size])
+
+
+def generate(kelas=10, siswa=32, bank=5, soal=50, pilihan=4, seed=0):
+    from __init__ import (db, Guru, Kelas, Siswa, BankSoal, Soal, PilihanSoal, Ujian, Jawaban,
+                          HasilManual, insert_bobot)
+
+    acak = random.Random(seed)
+    huruf = 'abcdefghij'[:pilihan]
+
+    jumlah_guru = max(1, kelas // 3)
+    insert(db, Guru, [{'nip': 'G%05d' % i, 'nama': 'Guru %d' % i, 'password': 'guru%d' % i}
+                      for i in range(1, jumlah_guru + 1)])
+    insert(db, Kelas, [{'id_guru': (i - 1) % jumlah_guru + 1, 'nama': 'Kelas %d' % i}
+                       for i in range(1, kelas + 1)])
+    insert(db, BankSoal, [{'nama': 'Bank Soal %d' % i} for i in range(1, bank + 1)])
+
+    id_siswa = {}
+    rows = []
+    for id_kelas in range(1, kelas + 1):
+        for _ in range(siswa):
+            nomor = len(rows) + 1
+            rows.append({'id_kelas': id_kelas, 'nis': 'S%06d' % nomor, 'nama': 'Siswa %d' % nomor,
+                         'jenis_kelamin': acak.choice(('L', 'P')), 'password': 'siswa%d' % nomor,
+                         'nilai_pretest': acak.randint(40, 100)})
+            id_siswa.setdefault(id_kelas, []).append(nomor)
+    insert(db, Siswa, rows)
+
+    # (id, difficulty, discrimination, kunci) per soal
+    soal_bank = {}
+    rows = []
+    pilihan_rows = []
+    for id_bank_soal in range(1, bank + 1):
+        for _ in range(soal):
+            nomor = len(rows) + 1
+            kunci = acak.choice(huruf)
+            rows.append({'id_bank_soal': id_bank_soal, 'pertanyaan': 'Soal %d bank %d' % (nomor, id_bank_soal)})
+            soal_bank.setdefault(id_bank_soal, []).append(
+                (nomor, acak.gauss(0, 1), acak.uniform(0.5, 2.0), kunci))
+
+            for h in huruf:
+                pilihan_rows.append({'id_soal': nomor, 'pilihan': h, 'is_right': int(h == kunci),
+                                     'analisis': 'Sudah benar' if h == kunci else 'Belum tepat',
+                                     'keterangan': 'Pilihan %s' % h})
+    insert(db, Soal, rows)
+    insert(db, PilihanSoal, pilihan_rows)
+
+    ujian = []
+    jawaban = []
+    hasil_manual = []
+    kemampuan = {id: acak.gauss(0, 1) for ids in id_siswa.values() for id in ids}
+
+    for id_kelas in range(1, kelas + 1):
+        for id_bank_soal in range(1, bank + 1):
+            ujian.append({'id_kelas': id_kelas, 'id_bank_soal': id_bank_soal, 'mata_pelajaran': 'Mapel %d' % id_bank_soal,
+                          'status': 0, 'tanggal_tes': '2020-01-%02d' % (id_bank_soal % 28 + 1),
+                          'waktu_selesai': '2020-01-%02d' % (id_bank_soal % 28 + 1)})
+            id_ujian = len(ujian)
+
+            for id in id_siswa[id_kelas]:
+                for id_soal, sulit, beda, kunci in soal_bank[id_bank_soal]:
+                    benar = acak.random() < 1 / (1 + math.exp(-beda * (kemampuan[id] - sulit)))
+                    pilih = kunci if benar else acak.choice([h for h in huruf if h != kunci])
+
+                    jawaban.append({'id_siswa': id, 'id_ujian': id_ujian, 'id_soal': id_soal, 'jawaban': pilih,
+                                    'kunci': kunci, 'analisis': '', 'keterangan': '', 'status': int(benar),
+                                    'pertanyaan': 'Soal %d' % id_soal})
+                    hasil_manual.append({'id_siswa': id, 'id_kelas': id_kelas, 'id_soal': id_soal,
+                                         'id_bank_soal': id_bank_soal, 'status': int(benar),
+                                         'b': 0, 'a': 0, 'l': 0, 'el': 0, 'p': 0})
+
+    insert(db, Ujian, ujian)
+    insert(db, Jawaban, jawaban)
+    insert(db, HasilManual, hasil_manual)
+
+    for id_kelas in range(1, kelas + 1):
+        for id_bank_soal in range(1, bank + 1):
+            insert_bobot(id_kelas, id_bank_soal)
+
+    db.session.commit()
+
+    return {'kelas': kelas, 'siswa': kelas * siswa, 'bank_soal': bank, 'soal': bank * soal,
+            'pilihan_soal': len(pilihan_rows), 'ujian': len(ujian), 'jawaban': len(jawaban),
+            'hasil_manual': len(hasil_manual)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', required=True)
+    parser.add_argument('--profile', default='production')
+    parser.add_argument('--kelas', type=int, default=10)
+    parser.add_argument('--siswa', type=int, default=32, help='siswa per kelas')
+    parser.add_argument('--bank', type=int, default=5)
+    parser.add_argument('--soal', type=int, default=50, help='soal per bank soal')
+    parser.add_argument('--pilihan', type=int, default=4, help='pilihan per soal')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        parser.error('%s already exists' % args.database)
+
+    start = time.monotonic()
+    app = load_app(os.path.abspath(args.database), args.profile)
+
+    with app.app_context():
+        jumlah = generate(args.kelas, args.siswa, args.bank, args.soal, args.pilihan, args.seed)
+
+    print(', '.join('%s %d' % item for item in jumlah.items()) + ' in %.1f s' % (time.monotonic() - start))
+
+
+if __name__ == '__main__':
+    main()
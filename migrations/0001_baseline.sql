@@ -0,0 +1,127 @@
+-- Schema of db.sqlite3 before versioned migrations
+CREATE TABLE IF NOT EXISTS siswa (
+	id INTEGER NOT NULL,
+	id_kelas INTEGER,
+	nis VARCHAR(100),
+	nama VARCHAR(100),
+	jenis_kelamin VARCHAR(100),
+	password VARCHAR(100),
+	nilai_pretest INTEGER,
+	PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS guru (
+	id INTEGER NOT NULL,
+	nip VARCHAR(100),
+	nama VARCHAR(100),
+	password VARCHAR(100),
+	PRIMARY KEY (id),
+	UNIQUE (nip)
+);
+
+CREATE TABLE IF NOT EXISTS kelas (
+	id INTEGER NOT NULL,
+	id_guru INTEGER,
+	nama VARCHAR(100),
+	PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS test (
+	id INTEGER NOT NULL,
+	pertanyaan VARCHAR(100),
+	PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS pilihan_test (
+	id INTEGER NOT NULL,
+	id_test INTEGER NOT NULL,
+	pilihan VARCHAR(100),
+	is_right INTEGER,
+	PRIMARY KEY (id),
+	FOREIGN KEY(id_test) REFERENCES test (id)
+);
+
+CREATE TABLE IF NOT EXISTS token (
+	id INTEGER NOT NULL,
+	token VARCHAR(100),
+	PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS ujian (
+	id INTEGER NOT NULL,
+	id_kelas INTEGER,
+	id_bank_soal INTEGER,
+	mata_pelajaran VARCHAR(100),
+	status INTEGER,
+	tanggal_tes VARCHAR(100),
+	waktu_selesai VARCHAR(100),
+	PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS bank_soal (
+	id INTEGER NOT NULL,
+	nama VARCHAR(100),
+	PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS soal (
+	id INTEGER NOT NULL,
+	id_bank_soal INTEGER,
+	pertanyaan VARCHAR(500),
+	PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS pilihan_soal (
+	id INTEGER NOT NULL,
+	id_soal INTEGER NOT NULL,
+	pilihan VARCHAR(100),
+	is_right INTEGER,
+	analisis VARCHAR(100),
+	keterangan VARCHAR(100),
+	PRIMARY KEY (id),
+	FOREIGN KEY(id_soal) REFERENCES soal (id)
+);
+
+CREATE TABLE IF NOT EXISTS jawaban (
+	id INTEGER NOT NULL,
+	id_siswa INTEGER,
+	id_ujian INTEGER,
+	id_soal INTEGER,
+	jawaban VARCHAR(100),
+	kunci VARCHAR(100),
+	analisis VARCHAR(100),
+	keterangan VARCHAR(100),
+	status INTEGER,
+	pertanyaan VARCHAR(200),
+	PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS hasil_manual (
+	id INTEGER NOT NULL,
+	id_siswa INTEGER,
+	id_kelas INTEGER,
+	id_soal INTEGER,
+	id_bank_soal INTEGER,
+	status INTEGER,
+	b FLOAT,
+	a FLOAT,
+	l FLOAT,
+	el FLOAT,
+	p FLOAT,
+	PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS bobot (
+	id INTEGER NOT NULL,
+	id_kelas INTEGER,
+	id_soal INTEGER,
+	pertanyaan VARCHAR(300),
+	id_bank_soal INTEGER,
+	b FLOAT,
+	a FLOAT,
+	l FLOAT,
+	el FLOAT,
+	p FLOAT,
+	cluster INTEGER,
+	PRIMARY KEY (id)
+);
@@ -0,0 +1,22 @@
+-- Indexes for the filters used by the exam and calibration endpoints
+CREATE INDEX IF NOT EXISTS ix_siswa_id_kelas ON siswa (id_kelas);
+
+CREATE INDEX IF NOT EXISTS ix_siswa_nis ON siswa (nis);
+
+CREATE INDEX IF NOT EXISTS ix_ujian_id_kelas_status_tanggal_tes ON ujian (id_kelas, status, tanggal_tes);
+
+CREATE INDEX IF NOT EXISTS ix_soal_id_bank_soal ON soal (id_bank_soal);
+
+CREATE INDEX IF NOT EXISTS ix_pilihan_soal_id_soal ON pilihan_soal (id_soal);
+
+CREATE INDEX IF NOT EXISTS ix_jawaban_id_siswa_id_ujian ON jawaban (id_siswa, id_ujian);
+
+CREATE INDEX IF NOT EXISTS ix_hasil_manual_id_kelas_id_soal_id_bank_soal ON hasil_manual (id_kelas, id_soal, id_bank_soal);
+
+CREATE INDEX IF NOT EXISTS ix_bobot_id_kelas_id_bank_soal_cluster ON bobot (id_kelas, id_bank_soal, cluster);
+
+-- Export and per-ujian reads filter Jawaban by id_ujian alone
+CREATE INDEX IF NOT EXISTS ix_jawaban_id_ujian ON jawaban (id_ujian);
+
+-- Pilihan of a page of Test are loaded with one id_test IN (...) query
+CREATE INDEX IF NOT EXISTS ix_pilihan_test_id_test ON pilihan_test (id_test);
@@ -0,0 +1,10 @@
+-- Shared version counter for the per-worker caches
+CREATE TABLE IF NOT EXISTS cache_version (
+	nama VARCHAR(100) NOT NULL,
+	versi INTEGER NOT NULL,
+	PRIMARY KEY (nama)
+);
+
+CREATE INDEX IF NOT EXISTS ix_cache_version_versi ON cache_version (versi);
+
+INSERT OR IGNORE INTO cache_version (nama, versi) VALUES ('global', 0);
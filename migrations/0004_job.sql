@@ -0,0 +1,23 @@
+-- Background analytics jobs. pid is the process that owns a job (the web
+-- worker while it waits, the pool process while it runs) and detak the time
+-- of its last progress, so jobs left behind by a killed or recycled worker
+-- can be failed
+CREATE TABLE IF NOT EXISTS job (
+	id INTEGER NOT NULL,
+	jenis VARCHAR(50),
+	id_bank_soal INTEGER,
+	id_kelas TEXT,
+	status VARCHAR(20),
+	total INTEGER,
+	selesai INTEGER,
+	hasil TEXT,
+	error TEXT,
+	dibuat FLOAT,
+	mulai FLOAT,
+	berakhir FLOAT,
+	pid INTEGER,
+	detak FLOAT,
+	PRIMARY KEY (id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_job_status ON job (status);
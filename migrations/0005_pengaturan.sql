@@ -0,0 +1,9 @@
+-- Application settings shared by all workers
+CREATE TABLE IF NOT EXISTS pengaturan (
+	nama VARCHAR(100) NOT NULL,
+	nilai TEXT,
+	PRIMARY KEY (nama)
+);
+
+-- Signing key for exam tickets, unless SECRET_KEY is set
+INSERT OR IGNORE INTO pengaturan (nama, nilai) VALUES ('secret_key', lower(hex(randomblob(32))));
@@ -0,0 +1,20 @@
+-- Server-side state of adaptive exam sessions; dilayani holds the id_soal
+-- already answered (a JSON list), so the next soal does not depend on
+-- positions in cluster lists that /cluster can rebuild
+CREATE TABLE IF NOT EXISTS sesi_ujian (
+	id INTEGER NOT NULL,
+	id_siswa INTEGER,
+	id_ujian INTEGER,
+	id_kelas INTEGER,
+	id_bank_soal INTEGER,
+	id_soal INTEGER,
+	jenis INTEGER,
+	index_mudah INTEGER,
+	index_sedang INTEGER,
+	index_susah INTEGER,
+	jumlah INTEGER,
+	selesai INTEGER,
+	dilayani TEXT,
+	PRIMARY KEY (id),
+	CONSTRAINT uq_sesi_ujian_id_siswa_id_ujian UNIQUE (id_siswa, id_ujian)
+);
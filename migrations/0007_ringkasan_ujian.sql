@@ -0,0 +1,101 @@
+-- Per-ujian score summaries, kept up to date by triggers on jawaban
+CREATE TABLE IF NOT EXISTS ringkasan_siswa (
+	id_ujian INTEGER NOT NULL,
+	id_siswa INTEGER NOT NULL,
+	jumlah INTEGER NOT NULL,
+	benar INTEGER NOT NULL,
+	PRIMARY KEY (id_ujian, id_siswa)
+);
+
+CREATE TABLE IF NOT EXISTS ringkasan_soal (
+	id_ujian INTEGER NOT NULL,
+	id_soal INTEGER NOT NULL,
+	jumlah INTEGER NOT NULL,
+	benar INTEGER NOT NULL,
+	PRIMARY KEY (id_ujian, id_soal)
+);
+
+CREATE TABLE IF NOT EXISTS ringkasan_analisis (
+	id_ujian INTEGER NOT NULL,
+	analisis VARCHAR(100) NOT NULL,
+	jumlah INTEGER NOT NULL,
+	PRIMARY KEY (id_ujian, analisis)
+);
+
+-- Backfill from the existing answers
+INSERT OR IGNORE INTO ringkasan_siswa (id_ujian, id_siswa, jumlah, benar)
+SELECT id_ujian, id_siswa, COUNT(*), SUM(status IS 1) FROM jawaban
+WHERE id_ujian IS NOT NULL AND id_siswa IS NOT NULL GROUP BY id_ujian, id_siswa;
+
+INSERT OR IGNORE INTO ringkasan_soal (id_ujian, id_soal, jumlah, benar)
+SELECT id_ujian, id_soal, COUNT(*), SUM(status IS 1) FROM jawaban
+WHERE id_ujian IS NOT NULL AND id_soal IS NOT NULL GROUP BY id_ujian, id_soal;
+
+INSERT OR IGNORE INTO ringkasan_analisis (id_ujian, analisis, jumlah)
+SELECT id_ujian, COALESCE(analisis, ''), COUNT(*) FROM jawaban
+WHERE id_ujian IS NOT NULL GROUP BY id_ujian, COALESCE(analisis, '');
+
+CREATE TRIGGER IF NOT EXISTS tr_jawaban_ringkasan_insert AFTER INSERT ON jawaban
+WHEN NEW.id_ujian IS NOT NULL
+BEGIN
+	INSERT OR IGNORE INTO ringkasan_siswa (id_ujian, id_siswa, jumlah, benar) VALUES (NEW.id_ujian, NEW.id_siswa, 0, 0);
+	UPDATE ringkasan_siswa SET jumlah = jumlah + 1, benar = benar + (NEW.status IS 1)
+	WHERE id_ujian = NEW.id_ujian AND id_siswa = NEW.id_siswa;
+
+	INSERT OR IGNORE INTO ringkasan_soal (id_ujian, id_soal, jumlah, benar) VALUES (NEW.id_ujian, NEW.id_soal, 0, 0);
+	UPDATE ringkasan_soal SET jumlah = jumlah + 1, benar = benar + (NEW.status IS 1)
+	WHERE id_ujian = NEW.id_ujian AND id_soal = NEW.id_soal;
+
+	INSERT OR IGNORE INTO ringkasan_analisis (id_ujian, analisis, jumlah) VALUES (NEW.id_ujian, COALESCE(NEW.analisis, ''), 0);
+	UPDATE ringkasan_analisis SET jumlah = jumlah + 1
+	WHERE id_ujian = NEW.id_ujian AND analisis = COALESCE(NEW.analisis, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_jawaban_ringkasan_delete AFTER DELETE ON jawaban
+WHEN OLD.id_ujian IS NOT NULL
+BEGIN
+	UPDATE ringkasan_siswa SET jumlah = jumlah - 1, benar = benar - (OLD.status IS 1)
+	WHERE id_ujian = OLD.id_ujian AND id_siswa = OLD.id_siswa;
+	DELETE FROM ringkasan_siswa WHERE id_ujian = OLD.id_ujian AND id_siswa = OLD.id_siswa AND jumlah <= 0;
+
+	UPDATE ringkasan_soal SET jumlah = jumlah - 1, benar = benar - (OLD.status IS 1)
+	WHERE id_ujian = OLD.id_ujian AND id_soal = OLD.id_soal;
+	DELETE FROM ringkasan_soal WHERE id_ujian = OLD.id_ujian AND id_soal = OLD.id_soal AND jumlah <= 0;
+
+	UPDATE ringkasan_analisis SET jumlah = jumlah - 1
+	WHERE id_ujian = OLD.id_ujian AND analisis = COALESCE(OLD.analisis, '');
+	DELETE FROM ringkasan_analisis WHERE id_ujian = OLD.id_ujian AND analisis = COALESCE(OLD.analisis, '') AND jumlah <= 0;
+END;
+
+-- An update is a delete of the old row followed by an insert of the new one
+CREATE TRIGGER IF NOT EXISTS tr_jawaban_ringkasan_update_old AFTER UPDATE OF id_ujian, id_siswa, id_soal, status, analisis ON jawaban
+WHEN OLD.id_ujian IS NOT NULL
+BEGIN
+	UPDATE ringkasan_siswa SET jumlah = jumlah - 1, benar = benar - (OLD.status IS 1)
+	WHERE id_ujian = OLD.id_ujian AND id_siswa = OLD.id_siswa;
+	DELETE FROM ringkasan_siswa WHERE id_ujian = OLD.id_ujian AND id_siswa = OLD.id_siswa AND jumlah <= 0;
+
+	UPDATE ringkasan_soal SET jumlah = jumlah - 1, benar = benar - (OLD.status IS 1)
+	WHERE id_ujian = OLD.id_ujian AND id_soal = OLD.id_soal;
+	DELETE FROM ringkasan_soal WHERE id_ujian = OLD.id_ujian AND id_soal = OLD.id_soal AND jumlah <= 0;
+
+	UPDATE ringkasan_analisis SET jumlah = jumlah - 1
+	WHERE id_ujian = OLD.id_ujian AND analisis = COALESCE(OLD.analisis, '');
+	DELETE FROM ringkasan_analisis WHERE id_ujian = OLD.id_ujian AND analisis = COALESCE(OLD.analisis, '') AND jumlah <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_jawaban_ringkasan_update_new AFTER UPDATE OF id_ujian, id_siswa, id_soal, status, analisis ON jawaban
+WHEN NEW.id_ujian IS NOT NULL
+BEGIN
+	INSERT OR IGNORE INTO ringkasan_siswa (id_ujian, id_siswa, jumlah, benar) VALUES (NEW.id_ujian, NEW.id_siswa, 0, 0);
+	UPDATE ringkasan_siswa SET jumlah = jumlah + 1, benar = benar + (NEW.status IS 1)
+	WHERE id_ujian = NEW.id_ujian AND id_siswa = NEW.id_siswa;
+
+	INSERT OR IGNORE INTO ringkasan_soal (id_ujian, id_soal, jumlah, benar) VALUES (NEW.id_ujian, NEW.id_soal, 0, 0);
+	UPDATE ringkasan_soal SET jumlah = jumlah + 1, benar = benar + (NEW.status IS 1)
+	WHERE id_ujian = NEW.id_ujian AND id_soal = NEW.id_soal;
+
+	INSERT OR IGNORE INTO ringkasan_analisis (id_ujian, analisis, jumlah) VALUES (NEW.id_ujian, COALESCE(NEW.analisis, ''), 0);
+	UPDATE ringkasan_analisis SET jumlah = jumlah + 1
+	WHERE id_ujian = NEW.id_ujian AND analisis = COALESCE(NEW.analisis, '');
+END;
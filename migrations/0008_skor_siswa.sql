@@ -0,0 +1,68 @@
+-- Running total score per siswa of a kelas and bank soal, kept by triggers
+-- on hasil_manual so one soal can be recalibrated without reading the whole
+-- matrix. urutan is the first hasil_manual id of the siswa, the column
+-- order generate_bobot ranks them in.
+CREATE TABLE IF NOT EXISTS skor_siswa (
+	id_kelas INTEGER NOT NULL,
+	id_bank_soal INTEGER NOT NULL,
+	id_siswa INTEGER NOT NULL,
+	jumlah INTEGER NOT NULL,
+	skor INTEGER NOT NULL,
+	urutan INTEGER NOT NULL,
+	PRIMARY KEY (id_kelas, id_bank_soal, id_siswa)
+);
+
+INSERT OR IGNORE INTO skor_siswa (id_kelas, id_bank_soal, id_siswa, jumlah, skor, urutan)
+SELECT id_kelas, id_bank_soal, id_siswa, COUNT(*), SUM(COALESCE(status, 0)), MIN(id) FROM hasil_manual
+WHERE id_kelas IS NOT NULL AND id_bank_soal IS NOT NULL AND id_siswa IS NOT NULL
+GROUP BY id_kelas, id_bank_soal, id_siswa;
+
+CREATE TRIGGER IF NOT EXISTS tr_hasil_manual_skor_insert AFTER INSERT ON hasil_manual
+BEGIN
+	INSERT OR IGNORE INTO skor_siswa (id_kelas, id_bank_soal, id_siswa, jumlah, skor, urutan)
+	VALUES (NEW.id_kelas, NEW.id_bank_soal, NEW.id_siswa, 0, 0, NEW.id);
+	UPDATE skor_siswa SET jumlah = jumlah + 1, skor = skor + COALESCE(NEW.status, 0), urutan = MIN(urutan, NEW.id)
+	WHERE id_kelas = NEW.id_kelas AND id_bank_soal = NEW.id_bank_soal AND id_siswa = NEW.id_siswa;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_hasil_manual_skor_delete AFTER DELETE ON hasil_manual
+BEGIN
+	UPDATE skor_siswa SET jumlah = jumlah - 1, skor = skor - COALESCE(OLD.status, 0)
+	WHERE id_kelas = OLD.id_kelas AND id_bank_soal = OLD.id_bank_soal AND id_siswa = OLD.id_siswa;
+	DELETE FROM skor_siswa
+	WHERE id_kelas = OLD.id_kelas AND id_bank_soal = OLD.id_bank_soal AND id_siswa = OLD.id_siswa AND jumlah <= 0;
+	UPDATE skor_siswa SET urutan = (
+		SELECT MIN(id) FROM hasil_manual
+		WHERE id_kelas = OLD.id_kelas AND id_bank_soal = OLD.id_bank_soal AND id_siswa = OLD.id_siswa)
+	WHERE id_kelas = OLD.id_kelas AND id_bank_soal = OLD.id_bank_soal AND id_siswa = OLD.id_siswa
+		AND urutan = OLD.id;
+END;
+
+-- Grading only changes status
+CREATE TRIGGER IF NOT EXISTS tr_hasil_manual_skor_status AFTER UPDATE OF status ON hasil_manual
+WHEN OLD.id_kelas IS NEW.id_kelas AND OLD.id_bank_soal IS NEW.id_bank_soal AND OLD.id_siswa IS NEW.id_siswa
+BEGIN
+	UPDATE skor_siswa SET skor = skor - COALESCE(OLD.status, 0) + COALESCE(NEW.status, 0)
+	WHERE id_kelas = NEW.id_kelas AND id_bank_soal = NEW.id_bank_soal AND id_siswa = NEW.id_siswa;
+END;
+
+-- A row moved to another kelas, bank soal or siswa counts as a delete plus
+-- an insert
+CREATE TRIGGER IF NOT EXISTS tr_hasil_manual_skor_pindah AFTER UPDATE OF id_kelas, id_bank_soal, id_siswa ON hasil_manual
+WHEN NOT (OLD.id_kelas IS NEW.id_kelas AND OLD.id_bank_soal IS NEW.id_bank_soal AND OLD.id_siswa IS NEW.id_siswa)
+BEGIN
+	UPDATE skor_siswa SET jumlah = jumlah - 1, skor = skor - COALESCE(OLD.status, 0)
+	WHERE id_kelas = OLD.id_kelas AND id_bank_soal = OLD.id_bank_soal AND id_siswa = OLD.id_siswa;
+	DELETE FROM skor_siswa
+	WHERE id_kelas = OLD.id_kelas AND id_bank_soal = OLD.id_bank_soal AND id_siswa = OLD.id_siswa AND jumlah <= 0;
+	UPDATE skor_siswa SET urutan = (
+		SELECT MIN(id) FROM hasil_manual
+		WHERE id_kelas = OLD.id_kelas AND id_bank_soal = OLD.id_bank_soal AND id_siswa = OLD.id_siswa)
+	WHERE id_kelas = OLD.id_kelas AND id_bank_soal = OLD.id_bank_soal AND id_siswa = OLD.id_siswa
+		AND urutan = OLD.id;
+
+	INSERT OR IGNORE INTO skor_siswa (id_kelas, id_bank_soal, id_siswa, jumlah, skor, urutan)
+	VALUES (NEW.id_kelas, NEW.id_bank_soal, NEW.id_siswa, 0, 0, NEW.id);
+	UPDATE skor_siswa SET jumlah = jumlah + 1, skor = skor + COALESCE(NEW.status, 0), urutan = MIN(urutan, NEW.id)
+	WHERE id_kelas = NEW.id_kelas AND id_bank_soal = NEW.id_bank_soal AND id_siswa = NEW.id_siswa;
+END;
@@ -0,0 +1,41 @@
+-- Write counter per kelas and bank soal for the on-disk response matrices;
+-- every change of hasil_manual, or of which soal have a Bobot row, bumps it
+CREATE TABLE IF NOT EXISTS versi_matrix (
+	id_kelas INTEGER NOT NULL,
+	id_bank_soal INTEGER NOT NULL,
+	versi INTEGER NOT NULL,
+	PRIMARY KEY (id_kelas, id_bank_soal)
+);
+
+CREATE TRIGGER IF NOT EXISTS tr_hasil_manual_versi_insert AFTER INSERT ON hasil_manual
+BEGIN
+	INSERT OR IGNORE INTO versi_matrix (id_kelas, id_bank_soal, versi) VALUES (NEW.id_kelas, NEW.id_bank_soal, 0);
+	UPDATE versi_matrix SET versi = versi + 1 WHERE id_kelas = NEW.id_kelas AND id_bank_soal = NEW.id_bank_soal;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_hasil_manual_versi_delete AFTER DELETE ON hasil_manual
+BEGIN
+	INSERT OR IGNORE INTO versi_matrix (id_kelas, id_bank_soal, versi) VALUES (OLD.id_kelas, OLD.id_bank_soal, 0);
+	UPDATE versi_matrix SET versi = versi + 1 WHERE id_kelas = OLD.id_kelas AND id_bank_soal = OLD.id_bank_soal;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_hasil_manual_versi_update AFTER UPDATE ON hasil_manual
+BEGIN
+	INSERT OR IGNORE INTO versi_matrix (id_kelas, id_bank_soal, versi) VALUES (OLD.id_kelas, OLD.id_bank_soal, 0);
+	UPDATE versi_matrix SET versi = versi + 1 WHERE id_kelas = OLD.id_kelas AND id_bank_soal = OLD.id_bank_soal;
+	INSERT OR IGNORE INTO versi_matrix (id_kelas, id_bank_soal, versi) VALUES (NEW.id_kelas, NEW.id_bank_soal, 0);
+	UPDATE versi_matrix SET versi = versi + 1 WHERE id_kelas = NEW.id_kelas AND id_bank_soal = NEW.id_bank_soal
+		AND NOT (OLD.id_kelas IS NEW.id_kelas AND OLD.id_bank_soal IS NEW.id_bank_soal);
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_bobot_versi_insert AFTER INSERT ON bobot
+BEGIN
+	INSERT OR IGNORE INTO versi_matrix (id_kelas, id_bank_soal, versi) VALUES (NEW.id_kelas, NEW.id_bank_soal, 0);
+	UPDATE versi_matrix SET versi = versi + 1 WHERE id_kelas = NEW.id_kelas AND id_bank_soal = NEW.id_bank_soal;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tr_bobot_versi_delete AFTER DELETE ON bobot
+BEGIN
+	INSERT OR IGNORE INTO versi_matrix (id_kelas, id_bank_soal, versi) VALUES (OLD.id_kelas, OLD.id_bank_soal, 0);
+	UPDATE versi_matrix SET versi = versi + 1 WHERE id_kelas = OLD.id_kelas AND id_bank_soal = OLD.id_bank_soal;
+END;
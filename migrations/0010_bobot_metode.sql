@@ -0,0 +1,4 @@
+-- Calibration method that produced b and a of a Bobot row: NULL or 'klasik'
+-- for the 27% method (b is the proportion right), 'irt' for the 2PL fit
+-- (b is the difficulty on the ability scale)
+ALTER TABLE bobot ADD COLUMN metode VARCHAR(20);
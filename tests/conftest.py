@@ -0,0 +1,32 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+# A migrated copy of db.sqlite3 behind the app, shared by every test; the
+# app reads its configuration at import, so the environment is set first
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('app')
+    database = str(directory / 'db.sqlite3')
+    shutil.copy(os.path.join(root, 'db.sqlite3'), database)
+
+    os.environ['DATABASE_URI'] = 'sqlite:///' + database
+    os.environ['DB_PROFILE'] = 'testing'
+    os.environ['METRICS_DIR'] = str(directory / 'metrics')
+    os.environ['PROFILE_DIR'] = str(directory / 'profiles')
+    os.environ['MATRIX_DIR'] = str(directory / 'matrix')
+    sys.path.insert(0, root)
+
+    from __init__ import getApp
+
+    return getApp()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+
+from conftest import root
+
+
+# Run a request in its own process against the same database, like a
+# second gunicorn worker
+def other_worker(app, method, url, body):
+    script = ('from __init__ import app\n'
+              'response = app.test_client().%s(%r, json=%r)\n'
+              'assert response.status_code == 200, response.status_code\n') % (method, url, body)
+    env = dict(os.environ, DATABASE_URI=app.config['SQLALCHEMY_DATABASE_URI'], DB_PROFILE='testing')
+
+    subprocess.run([sys.executable, '-c', script], cwd=root, env=env, check=True)
+
+
+def pertanyaan(client, id_bank_soal, id_soal):
+    return {soal['id']: soal['pertanyaan'] for soal in client.get('/soal/bank-soal/%d' % id_bank_soal).get_json()}[id_soal]
+
+
+# A Soal edited in another worker is served from the local cache until the
+# next version check, then read again
+def test_soal_edited_in_another_worker_is_dropped_on_the_next_check(app, client, monkeypatch):
+    from __init__ import db, Soal
+
+    with app.app_context():
+        soal = Soal.query.filter_by(id_bank_soal=2).order_by(Soal.id).first()
+        id_soal, lama = soal.id, soal.pertanyaan
+
+    monkeypatch.setitem(app.config, 'CACHE_VERSION_INTERVAL', 0)
+    assert pertanyaan(client, 2, id_soal) == lama
+
+    monkeypatch.setitem(app.config, 'CACHE_VERSION_INTERVAL', float('inf'))
+    other_worker(app, 'put', '/soal/%d' % id_soal, {'id_bank_soal': 2, 'pertanyaan': 'Diubah worker lain'})
+
+    assert pertanyaan(client, 2, id_soal) == lama
+
+    monkeypatch.setitem(app.config, 'CACHE_VERSION_INTERVAL', 0)
+
+    assert pertanyaan(client, 2, id_soal) == 'Diubah worker lain'
+
+    with app.app_context():
+        versi = {nama: versi for nama, versi in db.session.execute('SELECT nama, versi FROM cache_version')}
+
+    assert versi['soal:%d' % id_soal] == versi['global']
+    assert versi['bank_soal:2'] == versi['global']
+
+
+# A write in this worker drops its own entries at once
+def test_local_write_drops_the_local_entry(app, client, monkeypatch):
+    from __init__ import Soal
+
+    monkeypatch.setitem(app.config, 'CACHE_VERSION_INTERVAL', float('inf'))
+
+    with app.app_context():
+        id_soal = Soal.query.filter_by(id_bank_soal=2).order_by(Soal.id.desc()).first().id
+
+    pertanyaan(client, 2, id_soal)
+    client.put('/soal/%d' % id_soal, json={'id_bank_soal': 2, 'pertanyaan': 'Diubah di sini'})
+
+    assert pertanyaan(client, 2, id_soal) == 'Diubah di sini'
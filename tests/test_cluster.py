@@ -0,0 +1,66 @@
+import numpy as np
+
+
+def titik():
+    random = np.random.RandomState(3)
+
+    return np.vstack([random.normal(pusat, 0.3, (15, 2)) for pusat in ((0, 0), (4, 0), (0, 4))])
+
+
+def inersia(points, labels):
+    return sum(((points[labels == i] - points[labels == i].mean(axis=0)) ** 2).sum() for i in set(labels))
+
+
+# Stored labels stuck in a poor split are one candidate among the cold
+# starts, so the better cold result wins
+def test_warm_start_from_a_bad_labelling_reaches_the_cold_result():
+    from __init__ import kmeans
+
+    points = titik()
+    buruk = np.array([0] * 40 + [1] * 3 + [2] * 2)
+
+    dingin, _ = kmeans(points, 3)
+    hangat, _ = kmeans(points, 3, buruk)
+
+    assert np.isclose(inersia(points, hangat), inersia(points, dingin))
+    assert inersia(points, hangat) < inersia(points, buruk)
+
+
+# A labelling that is already optimal comes back with the same numbers
+def test_stable_labelling_is_kept():
+    from __init__ import kmeans
+
+    points = titik()
+    lama = np.array([2] * 15 + [0] * 15 + [1] * 15)
+
+    hasil, _ = kmeans(points, 3, lama)
+
+    assert hasil.tolist() == lama.tolist()
+
+
+# Once a bank soal has IRT rows, rows still on the klasik scale (metode
+# NULL from insert_bobot included) are not mixed into the clusters
+def test_only_rows_on_the_current_scale_are_clustered(app):
+    from __init__ import db, Bobot, cluster_bobot
+
+    irt = {1: -2.0, 2: -1.9, 3: 0.0, 4: 0.1, 5: 2.0, 6: 2.1}
+    klasik = {7: (0.9, None), 8: (0.2, 'klasik')}
+
+    with app.app_context():
+        for id_soal, b in irt.items():
+            bobot = Bobot(9401, id_soal, 'Soal %d' % id_soal, 9401, b, 1.0, 0, 0, 0, None)
+            bobot.metode = 'irt'
+            db.session.add(bobot)
+
+        for id_soal, (b, metode) in klasik.items():
+            bobot = Bobot(9401, id_soal, 'Soal %d' % id_soal, 9401, b, 1.0, 0, 0, 0, 1)
+            bobot.metode = metode
+            db.session.add(bobot)
+
+        db.session.commit()
+
+        hasil = cluster_bobot(9401, 9401)
+        cluster = {row.id_soal: row.cluster for row in Bobot.query.filter_by(id_kelas=9401, id_bank_soal=9401)}
+
+    assert hasil == {'cluster': [2, 2, 2]}
+    assert cluster == {1: 0, 2: 0, 3: 1, 4: 1, 5: 2, 6: 2, 7: None, 8: None}
@@ -0,0 +1,48 @@
+def test_derive_takes_the_latest_answer_of_the_kelas_and_bank_soal(app, client):
+    from __init__ import db, HasilManual, Jawaban, Siswa, Soal, Ujian
+
+    with app.app_context():
+        siswa = [id for (id,) in db.session.query(Siswa.id).filter_by(id_kelas=2).order_by(Siswa.id)]
+        lain = db.session.query(Siswa.id).filter_by(id_kelas=1).first()[0]
+
+        soal = [Soal(id_bank_soal=9801, pertanyaan='Soal %d' % i) for i in (1, 2, 3)]
+        ujian = [Ujian(id_kelas, id_bank_soal, 'Matematika', 1, '2020-01-01', '10:00')
+                 for id_kelas, id_bank_soal in ((2, 9801), (2, 9801), (1, 9801), (2, 9802))]
+        db.session.add_all(soal + ujian)
+        db.session.commit()
+
+        q1, q2, q3 = (s.id for s in soal)
+        u1, u2, u_kelas_lain, u_bank_lain = (u.id for u in ujian)
+
+        for id_siswa, id_ujian, id_soal, status in [
+                (siswa[0], u1, q1, 0), (siswa[0], u2, q1, 1),  # the later answer wins
+                (siswa[1], u1, q1, 2),                          # anything but 1 is wrong
+                (siswa[3], u1, q2, 1),
+                (siswa[2], u_kelas_lain, q2, 1),                # ujian of another kelas
+                (siswa[2], u_bank_lain, q2, 1),                 # ujian of another bank soal
+                (lain, u1, q1, 1)]:                             # siswa of another kelas
+            db.session.add(Jawaban(id_siswa, id_ujian, id_soal, 'a', 'a', '', '', status, ''))
+
+        # Graded by hand before: one row disagrees with the answers, one has
+        # no answer at all
+        db.session.add(HasilManual(siswa[1], 2, q1, 9801, 1, 0, 0, 0, 0, 0))
+        db.session.add(HasilManual(siswa[4], 2, q3, 9801, 1, 0, 0, 0, 0, 0))
+        db.session.commit()
+
+    response = client.post('/hasil-manual/derive/2/9801')
+
+    assert response.json == {'id_kelas': 2, 'id_bank_soal': 9801, 'jawaban': 3, 'diperbarui': 1,
+                             'ditambah': 3 * len(siswa) - 2}
+
+    with app.app_context():
+        status = {(row.id_siswa, row.id_soal): row.status for row in HasilManual.query.filter_by(
+            id_kelas=2, id_bank_soal=9801)}
+
+    benar = {(siswa[0], q1), (siswa[3], q2), (siswa[4], q3)}
+
+    assert status == {(s, q): int((s, q) in benar) for s in siswa for q in (q1, q2, q3)}
+
+    # Nothing left to do on a second run
+    response = client.post('/hasil-manual/derive/2/9801')
+
+    assert (response.json['diperbarui'], response.json['ditambah']) == (0, 0)
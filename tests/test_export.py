@@ -0,0 +1,71 @@
+import csv
+import io
+import json
+
+import pytest
+
+kolom = ('id_siswa', 'id_soal', 'jawaban', 'kunci', 'analisis', 'keterangan', 'status', 'pertanyaan')
+
+
+# Answers of three siswa to an Ujian, with text that needs CSV quoting
+@pytest.fixture(scope='module')
+def id_ujian(app):
+    client = app.test_client()
+
+    for id_siswa in (1, 2, 3):
+        data = [{'id_soal': id_soal, 'jawaban': 'a, "b"', 'kunci': 'a', 'analisis': 'Salah konsep',
+                 'keterangan': 'baris\nkedua', 'status': (id_siswa + id_soal) % 2,
+                 'pertanyaan': 'Turunan dari f(x) = %dx' % id_soal} for id_soal in (1, 2, 3, 4)]
+        response = client.post('/jawaban/batch', json={'id_siswa': id_siswa, 'id_ujian': 9301, 'data': data})
+        assert response.status_code == 200
+
+    return 9301
+
+
+def rows_db(app, id_ujian):
+    from __init__ import db, Jawaban
+
+    with app.app_context():
+        return [tuple(row) for row in db.session.query(*[getattr(Jawaban, k) for k in kolom]).filter_by(
+            id_ujian=id_ujian).order_by(Jawaban.id)]
+
+
+def test_ndjson_export_matches_the_database(app, client, id_ujian):
+    response = client.get('/ujian/%d/export?format=ndjson' % id_ujian)
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.status_code == 200
+    assert [tuple(line[k] for k in kolom) for line in lines] == rows_db(app, id_ujian)
+
+
+def test_csv_export_matches_the_database(app, client, monkeypatch, id_ujian):
+    # Several chunks
+    monkeypatch.setitem(app.config, 'EXPORT_CHUNK_SIZE', 5)
+
+    response = client.get('/ujian/%d/export?format=csv' % id_ujian)
+    reader = csv.reader(io.StringIO(response.get_data(as_text=True)))
+
+    assert next(reader) == list(kolom)
+    assert list(reader) == [[str(value) for value in row] for row in rows_db(app, id_ujian)]
+
+
+def test_exported_csv_uploads_into_another_ujian(app, client, id_ujian):
+    export = client.get('/ujian/%d/export?format=csv' % id_ujian).get_data(as_text=True)
+    data = list(csv.DictReader(io.StringIO(export)))
+
+    response = client.post('/jawaban/upload-batch/9302', json={'data': data})
+
+    assert response.status_code == 200
+    assert response.json == {'id_ujian': 9302, 'jumlah': 12}
+    assert rows_db(app, 9302) == rows_db(app, id_ujian)
+
+
+def test_upload_rejects_rows_without_integer_ids(app, client):
+    baris = dict(zip(kolom, ('1', '1', 'a', 'a', '', '', '1', 'Soal 1')))
+    data = [baris, dict(baris, id_siswa='x'), dict(baris, status=''), {'id_siswa': '1'}]
+
+    response = client.post('/jawaban/upload-batch/9303', json={'data': data})
+
+    assert response.status_code == 400
+    assert [item['index'] for item in response.json['ditolak']] == [1, 2, 3]
+    assert rows_db(app, 9303) == []
@@ -0,0 +1,54 @@
+import pytest
+
+
+def jawaban(id_soal, status=1, **kwargs):
+    data = {'id_soal': id_soal, 'jawaban': 'a', 'kunci': 'a', 'analisis': 'Sudah benar',
+            'keterangan': 'Sudah benar', 'status': status, 'pertanyaan': 'Soal %s' % id_soal}
+    data.update(kwargs)
+
+    return data
+
+
+def jawaban_siswa(app, id_siswa, id_ujian):
+    from __init__ import Jawaban
+
+    with app.app_context():
+        return [(row.id_soal, row.jawaban, row.status) for row in Jawaban.query.filter_by(
+            id_siswa=id_siswa, id_ujian=id_ujian).order_by(Jawaban.id)]
+
+
+def test_batch_inserts_every_entry(app, client):
+    response = client.post('/jawaban/batch', json={
+        'id_siswa': '9201', 'id_ujian': 9201, 'data': [jawaban(1), jawaban('2', status='0'), jawaban(3)]})
+
+    assert response.status_code == 200
+    assert response.json == {'id_siswa': 9201, 'id_ujian': 9201, 'jumlah': 3}
+    assert jawaban_siswa(app, 9201, 9201) == [(1, 'a', 1), (2, 'a', 0), (3, 'a', 1)]
+
+
+@pytest.mark.parametrize('body', [
+    {'id_ujian': 9202, 'data': [jawaban(1)]},
+    {'id_siswa': 'x', 'id_ujian': 9202, 'data': [jawaban(1)]},
+    {'id_siswa': 9202, 'id_ujian': 1.5, 'data': [jawaban(1)]},
+    {'id_siswa': 9202, 'id_ujian': 9202},
+    {'id_siswa': 9202, 'id_ujian': 9202, 'data': jawaban(1)},
+    [jawaban(1)],
+])
+def test_batch_rejects_a_malformed_body(app, client, body):
+    response = client.post('/jawaban/batch', json=body)
+
+    assert response.status_code == 400
+    assert 'ditolak' not in response.json
+    assert jawaban_siswa(app, 9202, 9202) == []
+
+
+def test_batch_rejects_every_bad_entry_and_writes_nothing(app, client):
+    tanpa_kunci = jawaban(2)
+    del tanpa_kunci['kunci']
+    data = [jawaban(1), tanpa_kunci, jawaban('x'), jawaban(4, status=None), 'jawaban', jawaban(6)]
+
+    response = client.post('/jawaban/batch', json={'id_siswa': 9203, 'id_ujian': 9203, 'data': data})
+
+    assert response.status_code == 400
+    assert [item['index'] for item in response.json['ditolak']] == [1, 2, 3, 4]
+    assert jawaban_siswa(app, 9203, 9203) == []
@@ -0,0 +1,105 @@
+import subprocess
+import time
+
+import pytest
+
+
+def buat_job(app, **kolom):
+    from __init__ import db, Job
+
+    with app.app_context():
+        job = Job('recalibrate', 1, [1])
+
+        for nama, nilai in kolom.items():
+            setattr(job, nama, nilai)
+
+        db.session.add(job)
+        db.session.commit()
+
+        return job.id
+
+
+def status_job(app, id):
+    from __init__ import Job
+
+    with app.app_context():
+        job = Job.query.get(id)
+
+        return job.status, job.error
+
+
+# Pid of a process that already exited
+@pytest.fixture(scope='module')
+def pid_mati():
+    proses = subprocess.Popen(['true'])
+    proses.wait()
+
+    return proses.pid
+
+
+def test_expire_fails_stalled_and_orphaned_jobs_only(app, monkeypatch, pid_mati):
+    from __init__ import expire_jobs
+
+    monkeypatch.setitem(app.config, 'JOB_TIMEOUT', 60)
+    lama = time.time() - 600
+
+    macet = buat_job(app, status='berjalan', mulai=lama, detak=lama)
+    jalan = buat_job(app, status='berjalan', mulai=lama, detak=time.time())
+    antre = buat_job(app, dibuat=lama, detak=lama)
+    yatim = buat_job(app, pid=pid_mati)
+
+    with app.app_context():
+        expire_jobs(macet, jalan, antre, yatim)
+
+    assert status_job(app, macet) == ('gagal', 'tidak ada progres selama 60 detik')
+    assert status_job(app, jalan) == ('berjalan', None)
+    assert status_job(app, antre) == ('menunggu', None)
+    assert status_job(app, yatim) == ('gagal', 'proses %d berhenti sebelum job selesai' % pid_mati)
+
+
+# A job failed while it sat in the queue is not started afterwards
+def test_run_job_does_not_restart_a_failed_job(app):
+    from __init__ import Job, run_job
+
+    id = buat_job(app, status='gagal', error='proses 1 berhenti sebelum job selesai')
+
+    run_job(id)
+
+    with app.app_context():
+        job = Job.query.get(id)
+
+        assert (job.status, job.mulai, job.selesai) == ('gagal', None, 0)
+
+
+def test_get_job_expires_before_reading(app, client, pid_mati):
+    id = buat_job(app, pid=pid_mati)
+
+    response = client.get('/jobs/%d' % id)
+
+    assert response.status_code == 200
+    assert response.json['status'] == 'gagal'
+
+
+@pytest.mark.parametrize('url, body', [
+    ('/jobs/recalibrate/x', {'id_kelas': [1]}),
+    ('/jobs/recalibrate/1.5', None),
+    ('/jobs/recalibrate/1', {'id_kelas': 1}),
+    ('/jobs/recalibrate/1', {'id_kelas': [1, 'x']}),
+])
+def test_recalibrate_rejects_bad_ids(app, client, url, body):
+    from __init__ import Job
+
+    with app.app_context():
+        jumlah = Job.query.count()
+
+    response = client.post(url, json=body)
+
+    assert response.status_code == 400
+
+    with app.app_context():
+        assert Job.query.count() == jumlah
+
+
+@pytest.mark.parametrize('id', ['x', '1.5', '999999'])
+def test_get_job_with_a_bad_id_is_not_found(client, id):
+    assert client.get('/jobs/%s' % id).status_code == 404
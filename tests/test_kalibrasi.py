@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+
+# Soal x siswa answers with tied totals, and b, a, l, el, p as the pandas
+# score table of the old generate_bobot computed them
+matrix = np.array([[1, 1, 0, 1, 0, 1, 1, 0, 1, 1],
+                   [0, 1, 0, 0, 0, 1, 1, 0, 0, 1],
+                   [1, 1, 1, 1, 0, 1, 1, 1, 1, 1],
+                   [0, 0, 0, 1, 0, 0, 1, 0, 0, 1],
+                   [1, 0, 0, 1, 1, 1, 1, 0, 0, 1]])
+
+expected = {
+    'b': [0.7, 0.4, 0.9, 0.3, 0.6],
+    'a': [1.0, 0.67, 0.33, 1.0, 0.67],
+    'l': [1.3, 1.07, 0.36, 1.7, 0.94],
+    'el': [3.67, 2.92, 1.44, 5.47, 2.55],
+    'p': [0.21, 0.26, 0.41, 0.15, 0.28],
+}
+
+
+def test_hitung_bobot_matches_the_pandas_score_table(app):
+    from __init__ import hitung_bobot
+
+    b, a, l, el, p = hitung_bobot(matrix)
+
+    for nama, values in zip(('b', 'a', 'l', 'el', 'p'), (b, a, l, el, p)):
+        assert values.tolist() == expected[nama], nama
+
+
+# Bobot rows for soal 1-3 of a fresh kelas and bank soal, with the given
+# (id_siswa, id_soal, status) Hasil Manual cells
+@pytest.fixture
+def kelas_bobot(app):
+    from __init__ import db, Bobot, HasilManual
+
+    def buat(id_kelas, cells):
+        with app.app_context():
+            for id_soal in (1, 2, 3):
+                db.session.add(Bobot(id_kelas, id_soal, 'Soal %d' % id_soal, id_kelas, 0, 0, 0, 0, 0, 0))
+
+            for id_siswa, id_soal, status in cells:
+                db.session.add(HasilManual(id_siswa, id_kelas, id_soal, id_kelas, status, 0, 0, 0, 0, 0))
+
+            db.session.commit()
+
+        return id_kelas
+
+    return buat
+
+
+def test_missing_hasil_manual_counts_as_wrong_of_every_siswa(app, kelas_bobot):
+    from __init__ import Bobot, kalibrasi_bobot
+
+    # Siswa 4 has no row for soal 2
+    cells = [(id_siswa, id_soal, 1) for id_siswa in (1, 2, 3, 4) for id_soal in (1, 2, 3)
+             if (id_siswa, id_soal) != (4, 2)]
+    id_kelas = kelas_bobot(9101, cells)
+
+    with app.app_context():
+        hasil = kalibrasi_bobot(id_kelas, id_kelas)
+        b = dict((row.id_soal, row.b) for row in Bobot.query.filter_by(id_kelas=id_kelas))
+
+    assert hasil == {'jumlah_soal': 3, 'jumlah_siswa': 4}
+    assert b == {1: 1.0, 2: 0.75, 3: 1.0}
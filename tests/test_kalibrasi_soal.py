@@ -0,0 +1,65 @@
+import numpy as np
+
+
+def bobot_kelas(app, id_kelas, id_bank_soal):
+    from __init__ import Bobot
+
+    with app.app_context():
+        return {row.id_soal: (row.b, row.a, row.l, row.el, row.p) for row in Bobot.query.filter_by(
+            id_kelas=id_kelas, id_bank_soal=id_bank_soal)}
+
+
+def kalibrasi_penuh(app, id_kelas, id_bank_soal):
+    from __init__ import kalibrasi_bobot
+
+    with app.app_context():
+        kalibrasi_bobot(id_kelas, id_bank_soal)
+
+    return bobot_kelas(app, id_kelas, id_bank_soal)
+
+
+# The soal touched by an insert or a batch update ends up with the b and a
+# a full recalibration gives it
+def test_incremental_recalibration_matches_a_full_run(app, client):
+    from __init__ import db, Bobot, HasilManual, Siswa
+
+    id_kelas, id_bank_soal = 2, 9501
+    random = np.random.RandomState(7)
+
+    with app.app_context():
+        siswa = [id for (id,) in db.session.query(Siswa.id).filter_by(id_kelas=id_kelas).order_by(Siswa.id)]
+
+        for id_soal in (1, 2, 3, 4):
+            db.session.add(Bobot(id_kelas, id_soal, 'Soal %d' % id_soal, id_bank_soal, 0, 0, 0, 0, 0, 0))
+
+        # Soal 1-3 graded for the first 20 siswa only
+        for id_soal in (1, 2, 3):
+            for id_siswa in siswa[:20]:
+                db.session.add(HasilManual(id_siswa, id_kelas, id_soal, id_bank_soal,
+                                           int(random.rand() < 0.3 * id_soal), 0, 0, 0, 0, 0))
+
+        db.session.commit()
+
+    kalibrasi_penuh(app, id_kelas, id_bank_soal)
+
+    # Insert: soal 1 gets a wrong answer for every other siswa of the kelas,
+    # which lowers its b
+    sebelum = bobot_kelas(app, id_kelas, id_bank_soal)
+    client.post('/hasil-manual/sync/%d/1/%d' % (id_kelas, id_bank_soal))
+    sesudah = bobot_kelas(app, id_kelas, id_bank_soal)
+
+    assert sesudah[1][0] < sebelum[1][0]
+    assert sesudah[1] == kalibrasi_penuh(app, id_kelas, id_bank_soal)[1]
+
+    client.post('/hasil-manual/sync/%d/4/%d' % (id_kelas, id_bank_soal))
+
+    # Batch update of soal 4 and soal 1, by id_siswa
+    for id_soal in (4, 1):
+        data = [{'id_siswa': id_siswa, 'status': int(random.rand() < 0.5)} for id_siswa in siswa]
+        response = client.put('/hasil-manual/batch-update/%d/%d/%d' % (id_kelas, id_soal, id_bank_soal),
+                              json={'data': data})
+        assert response.status_code == 200 and response.json
+
+        sesudah = bobot_kelas(app, id_kelas, id_bank_soal)
+
+        assert sesudah[id_soal] == kalibrasi_penuh(app, id_kelas, id_bank_soal)[id_soal]
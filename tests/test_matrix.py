@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+
+
+def berkas(app, id_kelas, id_bank_soal):
+    from __init__ import get_matrix_dir
+
+    with app.app_context():
+        awalan = '%d_%d_' % (id_kelas, id_bank_soal)
+
+        return sorted(nama for nama in os.listdir(get_matrix_dir()) if nama.startswith(awalan))
+
+
+def baca_matrix(app, id_kelas, id_bank_soal):
+    from __init__ import get_matrix_hasil_manual, load_matrix_hasil_manual
+
+    with app.app_context():
+        tersimpan = get_matrix_hasil_manual(id_kelas, id_bank_soal)
+        dari_db = load_matrix_hasil_manual(id_kelas, id_bank_soal)
+
+    for a, b in zip(tersimpan, dari_db):
+        assert np.array_equal(a, b)
+
+    return tersimpan
+
+
+# A Hasil Manual or Bobot write bumps versi_matrix, so the next read
+# rebuilds the .npy files instead of serving the old matrix
+def test_matrix_file_is_rebuilt_after_a_write(app, client):
+    from __init__ import db, Bobot, HasilManual
+
+    id_kelas = id_bank_soal = 9701
+
+    with app.app_context():
+        for id_soal in (1, 2):
+            db.session.add(Bobot(id_kelas, id_soal, 'Soal %d' % id_soal, id_bank_soal, 0, 0, 0, 0, 0, 0))
+
+        for id_siswa in (1, 2, 3):
+            for id_soal in (1, 2):
+                db.session.add(HasilManual(id_siswa, id_kelas, id_soal, id_bank_soal, 0, 0, 0, 0, 0, 0))
+
+        db.session.commit()
+        id = HasilManual.query.filter_by(id_kelas=id_kelas, id_siswa=2, id_soal=1).first().id
+
+    baca_matrix(app, id_kelas, id_bank_soal)
+    awal = berkas(app, id_kelas, id_bank_soal)
+
+    # Served from the memory-mapped file while nothing changed
+    assert isinstance(baca_matrix(app, id_kelas, id_bank_soal)[2], np.memmap)
+    assert len(awal) == 3
+
+    client.put('/hasil-manual/status/%d/1' % id)
+    matrix = baca_matrix(app, id_kelas, id_bank_soal)[2]
+
+    assert matrix.tolist() == [[0, 1, 0], [0, 0, 0]]
+    assert berkas(app, id_kelas, id_bank_soal) != awal
+    assert len(berkas(app, id_kelas, id_bank_soal)) == 3
+
+    # A new Bobot row adds a soal to the matrix
+    with app.app_context():
+        db.session.add(Bobot(id_kelas, 3, 'Soal 3', id_bank_soal, 0, 0, 0, 0, 0, 0))
+        db.session.commit()
+
+    assert baca_matrix(app, id_kelas, id_bank_soal)[2].shape == (3, 3)
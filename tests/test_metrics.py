@@ -0,0 +1,107 @@
+import json
+import os
+import re
+import subprocess
+
+sample = re.compile(r'^([a-z_]+)\{([^}]*)\} (\S+)$')
+
+
+# {(name, labels): value} of the exposition text; every sample follows the
+# TYPE line of its metric family
+def parse(text):
+    hasil = {}
+    jenis = {}
+    sekarang = None
+
+    assert text.endswith('\n')
+
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            continue
+
+        if line.startswith('# TYPE '):
+            _, _, nama, tipe = line.split(' ')
+            jenis[nama] = tipe
+            sekarang = nama
+            continue
+
+        match = sample.match(line)
+        assert match, line
+
+        nama, labels, nilai = match.groups()
+        assert nama == sekarang or nama.startswith(sekarang + '_'), line
+
+        labels = tuple(sorted(re.findall(r'(\w+)="([^"]*)"', labels)))
+        hasil[(nama, labels)] = float(nilai)
+
+    return hasil, jenis
+
+
+def get_metrics(client):
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+    return parse(response.get_data(as_text=True))
+
+
+def test_metrics_text_format(app, client):
+    client.get('/siswa?limit=2')
+    client.get('/jobs/x')
+    hasil, jenis = get_metrics(client)
+
+    assert jenis == {'http_request_duration_seconds': 'histogram', 'http_requests_total': 'counter',
+                     'db_statements_total': 'counter', 'db_statement_duration_seconds_total': 'counter'}
+
+    endpoint = (('endpoint', 'get_all_siswa'),)
+    bucket = sorted((float(dict(labels)['le']), nilai) for (nama, labels), nilai in hasil.items()
+                    if nama == 'http_request_duration_seconds_bucket' and dict(labels)['endpoint'] == 'get_all_siswa')
+    count = hasil[('http_request_duration_seconds_count', endpoint)]
+
+    # Cumulative buckets ending in +Inf == count
+    assert [le for le, _ in bucket] == list(app.config['METRICS_BUCKETS']) + [float('inf')]
+    assert [nilai for _, nilai in bucket] == sorted(nilai for _, nilai in bucket)
+    assert bucket[-1][1] == count >= 1
+    assert hasil[('http_request_duration_seconds_sum', endpoint)] > 0
+
+    assert hasil[('http_requests_total', (('endpoint', 'get_all_siswa'), ('status', '200')))] == count
+    assert hasil[('http_requests_total', (('endpoint', 'get_job'), ('status', '404')))] >= 1
+    assert hasil[('db_statements_total', endpoint)] >= count
+
+
+# Counters only grow, by one per request
+def test_metrics_count_every_request(client):
+    sebelum, _ = get_metrics(client)
+    client.get('/siswa?limit=2')
+    client.get('/siswa?limit=2')
+    sesudah, _ = get_metrics(client)
+
+    kunci = ('http_requests_total', (('endpoint', 'get_all_siswa'), ('status', '200')))
+
+    assert sesudah[kunci] == sebelum.get(kunci, 0) + 2
+
+
+# The snapshot of a worker that exited is folded in once
+def test_snapshot_of_a_dead_worker_is_kept_once(app, client):
+    from __init__ import get_metrics_dir
+
+    proses = subprocess.Popen(['true'])
+    proses.wait()
+
+    with app.app_context():
+        directory = get_metrics_dir()
+
+    snapshot = {'worker_mati': {'status': {'200': 3}, 'buckets': [3] + [0] * 10, 'sum': 0.01, 'count': 3,
+                                'sql_count': 6, 'sql_seconds': 0.002}}
+
+    os.makedirs(directory, exist_ok=True)
+
+    with open(os.path.join(directory, '%d-abcd.json' % proses.pid), 'w') as f:
+        f.write(json.dumps(snapshot))
+
+    kunci = ('http_requests_total', (('endpoint', 'worker_mati'), ('status', '200')))
+
+    assert get_metrics(client)[0][kunci] == 3
+    assert get_metrics(client)[0][kunci] == 3
+    assert not os.path.exists(os.path.join(directory, '%d-abcd.json' % proses.pid))
@@ -0,0 +1,67 @@
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+
+from conftest import root
+
+# Hot lookups and the index migration 0002 gives each of them
+queries = [
+    ('SELECT * FROM jawaban WHERE id_siswa = 1 AND id_ujian = 1', 'ix_jawaban_id_siswa_id_ujian'),
+    ('SELECT * FROM hasil_manual WHERE id_kelas = 1 AND id_soal = 50 AND id_bank_soal = 1',
+     'ix_hasil_manual_id_kelas_id_soal_id_bank_soal'),
+    ('SELECT * FROM bobot WHERE id_kelas = 1 AND id_bank_soal = 1', 'ix_bobot_id_kelas_id_bank_soal_cluster'),
+]
+
+
+def query_plan(database, query):
+    connection = sqlite3.connect(database)
+
+    try:
+        return ' '.join(row[3] for row in connection.execute('EXPLAIN QUERY PLAN ' + query))
+    finally:
+        connection.close()
+
+
+def user_version(database):
+    connection = sqlite3.connect(database)
+
+    try:
+        return connection.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        connection.close()
+
+
+# Run migrate() in its own process, like 'flask migrate' on a deploy
+def run_migrate(database):
+    env = dict(os.environ, DATABASE_URI='sqlite:///' + database, DB_PROFILE='testing')
+    subprocess.run([sys.executable, '-c', 'from __init__ import migrate; migrate()'],
+                   cwd=root, env=env, check=True)
+
+
+def test_migrate_turns_scans_into_index_searches(tmp_path):
+    database = str(tmp_path / 'db.sqlite3')
+    shutil.copy(os.path.join(root, 'db.sqlite3'), database)
+
+    before = [query_plan(database, query) for query, index in queries]
+    run_migrate(database)
+    after = [query_plan(database, query) for query, index in queries]
+
+    for (query, index), plan in zip(queries, before):
+        assert plan.startswith('SCAN'), (query, plan)
+
+    for (query, index), plan in zip(queries, after):
+        assert plan.startswith('SEARCH') and 'USING INDEX ' + index in plan, (query, plan)
+
+
+def test_migrate_is_idempotent(tmp_path):
+    database = str(tmp_path / 'db.sqlite3')
+    shutil.copy(os.path.join(root, 'db.sqlite3'), database)
+
+    run_migrate(database)
+    versi = user_version(database)
+    run_migrate(database)
+
+    assert versi == len(os.listdir(os.path.join(root, 'migrations')))
+    assert user_version(database) == versi
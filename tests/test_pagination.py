@@ -0,0 +1,65 @@
+import pytest
+
+
+@pytest.fixture
+def id_siswa(app):
+    from __init__ import db, Siswa
+
+    with app.app_context():
+        return [id for (id,) in db.session.query(Siswa.id).order_by(Siswa.id)]
+
+
+# Without after_id or limit every row is returned, whatever PAGE_LIMIT is
+def test_list_without_paging_is_not_truncated(app, client, monkeypatch, id_siswa):
+    monkeypatch.setitem(app.config, 'PAGE_LIMIT', 5)
+
+    response = client.get('/siswa')
+
+    assert response.status_code == 200
+    assert [siswa['id'] for siswa in response.get_json()] == id_siswa
+    assert 'X-Next-After-Id' not in response.headers
+
+
+def test_pages_follow_the_cursor_to_the_end(client, id_siswa):
+    ids = []
+    url = '/siswa?limit=7'
+
+    for _ in range(len(id_siswa)):
+        response = client.get(url)
+        page = [siswa['id'] for siswa in response.get_json()]
+        ids += page
+
+        if 'X-Next-After-Id' not in response.headers:
+            break
+
+        assert response.headers['X-Next-After-Id'] == str(page[-1])
+        url = '/siswa?limit=7&after_id=' + response.headers['X-Next-After-Id']
+
+    assert ids == id_siswa
+
+
+# A page that ends exactly at the last row has no cursor, and paging past
+# the end returns an empty list
+def test_cursor_at_the_end_of_the_list(client, id_siswa):
+    response = client.get('/siswa?after_id=%d&limit=3' % id_siswa[-4])
+
+    assert [siswa['id'] for siswa in response.get_json()] == id_siswa[-3:]
+    assert 'X-Next-After-Id' not in response.headers
+
+    response = client.get('/siswa?after_id=%d' % id_siswa[-1])
+
+    assert response.get_json() == []
+    assert 'X-Next-After-Id' not in response.headers
+
+
+def test_fields_selects_known_columns_only(client, id_siswa):
+    response = client.get('/siswa?limit=3&fields=id,nama,bukan_kolom')
+    body = response.get_json()
+
+    assert [sorted(siswa) for siswa in body] == [['id', 'nama']] * 3
+    assert [siswa['id'] for siswa in body] == id_siswa[:3]
+
+    response = client.get('/siswa?limit=3&fields=bukan_kolom')
+
+    assert sorted(response.get_json()[0]) == ['id', 'id_kelas', 'jenis_kelamin', 'nama', 'nilai_pretest',
+                                              'nis', 'password']
@@ -0,0 +1,84 @@
+import io
+import os
+import pstats
+import shutil
+
+import pytest
+
+
+@pytest.fixture
+def profil(app, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, 'PROFILE_TOKEN', 'rahasia')
+    monkeypatch.setitem(app.config, 'PROFILE_DIR', str(tmp_path / 'profiles'))
+
+    return {'X-Profile': 'rahasia'}
+
+
+def daftar(client, headers):
+    response = client.get('/debug/profiles', headers=headers)
+
+    assert response.status_code == 200
+
+    return response.json
+
+
+def test_profiled_request_is_saved_with_its_sql(app, client, profil):
+    response = client.get('/siswa?limit=2&profile=rahasia')
+    profiles = daftar(client, profil)
+
+    assert response.status_code == 200
+    assert len(profiles) == 1
+
+    info = profiles[0]
+
+    assert (info['method'], info['path'], info['query'], info['status']) == ('GET', '/siswa', 'limit=2', 200)
+    assert info['sql_count'] >= 1 and info['seconds'] > 0
+
+    stats = client.get(info['stats'], headers=profil)
+    path = os.path.join(app.config['PROFILE_DIR'], 'download.prof')
+
+    with open(path, 'wb') as f:
+        f.write(stats.data)
+
+    assert any(fungsi == 'get_all_siswa' for _, _, fungsi in pstats.Stats(path, stream=io.StringIO()).stats)
+
+    sql = client.get(info['sql'], headers=profil).json
+
+    assert len(sql['statements']) == info['sql_count']
+    assert any('FROM siswa' in item['statement'] for item in sql['statements'])
+
+
+# Without the right token nothing is profiled and the routes are closed
+def test_wrong_or_missing_token(app, client, profil):
+    client.get('/siswa?limit=2', headers={'X-Profile': 'salah'})
+    client.get('/siswa?limit=2')
+
+    assert daftar(client, profil) == []
+    assert client.get('/debug/profiles', headers={'X-Profile': 'salah'}).status_code == 403
+    assert client.get('/debug/profiles/x', headers={'X-Profile': 'salah'}).status_code == 403
+    assert client.get('/debug/profiles/x/sql').status_code == 403
+    assert client.get('/debug/profiles/x', headers=profil).status_code == 404
+
+    app.config['PROFILE_TOKEN'] = None
+
+    assert client.get('/debug/profiles', headers={'X-Profile': ''}).status_code == 403
+
+
+# The listing routes carry the token but are not profiled themselves, and
+# only the newest PROFILE_KEEP profiles are kept
+def test_rotation_keeps_the_newest(app, client, profil, monkeypatch):
+    monkeypatch.setitem(app.config, 'PROFILE_KEEP', 2)
+
+    for limit in (1, 2, 3):
+        client.get('/siswa?limit=%d' % limit, headers=profil)
+        daftar(client, profil)
+
+    profiles = daftar(client, profil)
+
+    assert [info['query'] for info in profiles] == ['limit=3', 'limit=2']
+    assert sorted(os.listdir(app.config['PROFILE_DIR'])) == sorted(
+        info['nama'] + ext for info in profiles for ext in ('.json', '.prof'))
+
+    shutil.rmtree(app.config['PROFILE_DIR'])
+
+    assert daftar(client, profil) == []
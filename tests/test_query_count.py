@@ -0,0 +1,116 @@
+import pytest
+from sqlalchemy import event
+
+
+# Statements sent to the database, with the exam caches emptied so every
+# call takes the cold path
+@pytest.fixture
+def statements(app, monkeypatch):
+    from __init__ import db, cache_soal, cache_bank_soal, routing_bobot
+
+    # No cache version poll in the middle of a count
+    monkeypatch.setitem(app.config, 'CACHE_VERSION_INTERVAL', float('inf'))
+
+    cache_soal.clear()
+    cache_bank_soal.clear()
+    routing_bobot.clear()
+
+    executed = []
+
+    def count(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+
+    yield executed
+
+    with app.app_context():
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+
+@pytest.fixture(scope='module')
+def tests_with_pilihan(app):
+    from __init__ import db, Test, PilihanTest
+
+    with app.app_context():
+        if not Test.query.count():
+            for nomor in range(30):
+                test = Test(pertanyaan='Test %d' % nomor)
+                db.session.add(test)
+                db.session.flush()
+                db.session.add_all([PilihanTest(test.id, pilihan, int(pilihan == 'a')) for pilihan in 'abcd'])
+
+            db.session.commit()
+
+
+@pytest.fixture(scope='module')
+def routing(app):
+    client = app.test_client()
+
+    assert client.put('/bobot/generate/1/1').status_code == 200
+    assert client.put('/cluster/1/1').status_code == 200
+
+    with app.app_context():
+        from __init__ import get_routing_bobot
+
+        return get_routing_bobot(1, 1)
+
+
+# Two statements (Soal, then all their Pilihan) for a bank of 100 soal and
+# a bank of 50
+@pytest.mark.parametrize('id_bank_soal', [1, 2])
+def test_soal_bank_soal_is_not_n_plus_one(client, statements, id_bank_soal):
+    response = client.get('/soal/bank-soal/%d' % id_bank_soal)
+
+    assert response.status_code == 200
+    assert len(response.get_json()) >= 50
+    assert len(statements) == 2
+
+
+def test_soal_bank_soal_is_served_from_cache(client, statements):
+    client.get('/soal/bank-soal/1')
+    del statements[:]
+
+    assert client.get('/soal/bank-soal/1').status_code == 200
+    assert statements == []
+
+
+# One page query plus one IN query for the Pilihan of the whole page
+def test_alltest_loads_pilihan_in_one_query(client, statements, tests_with_pilihan):
+    response = client.get('/alltest?limit=20')
+    body = response.get_json()
+
+    assert response.status_code == 200
+    assert len(body) == 20
+    assert all(len(test['pilihan']) == 4 for test in body)
+    assert len(statements) == 2
+
+
+# Routing table, then the Soal and its Pilihan
+def test_first_soal(client, statements, routing):
+    response = client.get('/bobot/first-soal/1/1')
+
+    assert response.status_code == 200
+    assert response.get_json()['id'] == routing['cluster'][0][0]
+    assert len(statements) == 3
+
+
+def test_next_soal(client, statements, routing):
+    id_soal = routing['cluster'][0][0]
+    jenis = routing['next'][id_soal][1][1]
+
+    response = client.get('/bobot/next-soal/1/1/%d/1/0/0/0' % id_soal)
+
+    assert response.status_code == 200
+    assert response.get_json()['id'] == routing['cluster'][jenis][0]
+    assert len(statements) == 3
+
+
+# A non-numeric bank soal is an empty list, as before the cache
+def test_soal_bank_soal_with_a_bad_id_is_empty(client, statements):
+    response = client.get('/soal/bank-soal/abc')
+
+    assert response.status_code == 200
+    assert response.get_json() == []
+    assert statements == []
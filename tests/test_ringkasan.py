@@ -0,0 +1,118 @@
+import numpy as np
+
+# What the trigger-maintained tables must hold, straight from the source rows
+group_by = {
+    'ringkasan_siswa': 'SELECT id_ujian, id_siswa, COUNT(*), SUM(status IS 1) FROM jawaban '
+                       'WHERE id_ujian IS NOT NULL AND id_siswa IS NOT NULL GROUP BY id_ujian, id_siswa',
+    'ringkasan_soal': 'SELECT id_ujian, id_soal, COUNT(*), SUM(status IS 1) FROM jawaban '
+                      'WHERE id_ujian IS NOT NULL AND id_soal IS NOT NULL GROUP BY id_ujian, id_soal',
+    'ringkasan_analisis': "SELECT id_ujian, COALESCE(analisis, ''), COUNT(*) FROM jawaban "
+                          "WHERE id_ujian IS NOT NULL GROUP BY id_ujian, COALESCE(analisis, '')",
+    'skor_siswa': 'SELECT id_kelas, id_bank_soal, id_siswa, COUNT(*), SUM(COALESCE(status, 0)), MIN(id) '
+                  'FROM hasil_manual WHERE id_kelas IS NOT NULL AND id_bank_soal IS NOT NULL '
+                  'AND id_siswa IS NOT NULL GROUP BY id_kelas, id_bank_soal, id_siswa',
+}
+
+kolom = {
+    'ringkasan_siswa': 'id_ujian, id_siswa, jumlah, benar',
+    'ringkasan_soal': 'id_ujian, id_soal, jumlah, benar',
+    'ringkasan_analisis': 'id_ujian, analisis, jumlah',
+    'skor_siswa': 'id_kelas, id_bank_soal, id_siswa, jumlah, skor, urutan',
+}
+
+
+def assert_ringkasan_cocok(app):
+    from __init__ import db
+
+    with app.app_context():
+        for tabel, query in group_by.items():
+            tersimpan = sorted(tuple(row) for row in db.session.execute(
+                'SELECT %s FROM %s' % (kolom[tabel], tabel)))
+
+            assert tersimpan == sorted(tuple(row) for row in db.session.execute(query)), tabel
+
+
+def pilih(random, pilihan):
+    return pilihan[random.randint(len(pilihan))]
+
+
+# Random inserts, updates (status, analisis and moves to another ujian,
+# siswa or soal) and deletes, NULLs included
+def test_triggers_match_group_by_after_random_writes(app):
+    from __init__ import db
+
+    random = np.random.RandomState(11)
+    ujian, siswa, soal = (9601, 9602), (1, 2, 3, None), (1, 2, 3, 4)
+    status, analisis = (0, 1, 2, None), ('Sudah benar', 'Salah konsep', None)
+    kelas, bank_soal = (9601, 9602), (9601,)
+
+    for _ in range(300):
+        with app.app_context():
+            jawaban = [id for (id,) in db.session.execute(
+                'SELECT id FROM jawaban WHERE id_ujian IN (9601, 9602) OR id_ujian IS NULL')]
+            hasil_manual = [id for (id,) in db.session.execute(
+                'SELECT id FROM hasil_manual WHERE id_kelas IN (9601, 9602) OR id_kelas IS NULL')]
+            langkah = random.randint(8)
+
+            if langkah <= 1 or not jawaban or not hasil_manual:
+                db.session.execute(
+                    'INSERT INTO jawaban (id_siswa, id_ujian, id_soal, jawaban, status, analisis) '
+                    "VALUES (:siswa, :ujian, :soal, 'a', :status, :analisis)",
+                    {'siswa': pilih(random, siswa), 'ujian': pilih(random, ujian + (None,)),
+                     'soal': pilih(random, soal), 'status': pilih(random, status),
+                     'analisis': pilih(random, analisis)})
+                db.session.execute(
+                    'INSERT INTO hasil_manual (id_siswa, id_kelas, id_soal, id_bank_soal, status) '
+                    'VALUES (:siswa, :kelas, :soal, :bank_soal, :status)',
+                    {'siswa': pilih(random, siswa), 'kelas': pilih(random, kelas), 'soal': pilih(random, soal),
+                     'bank_soal': pilih(random, bank_soal), 'status': pilih(random, status)})
+            elif langkah == 2:
+                db.session.execute('UPDATE jawaban SET status = :status, analisis = :analisis WHERE id = :id',
+                                   {'id': pilih(random, jawaban), 'status': pilih(random, status),
+                                    'analisis': pilih(random, analisis)})
+            elif langkah == 3:
+                db.session.execute('UPDATE jawaban SET id_ujian = :ujian, id_siswa = :siswa, id_soal = :soal '
+                                   'WHERE id = :id',
+                                   {'id': pilih(random, jawaban), 'ujian': pilih(random, ujian + (None,)),
+                                    'siswa': pilih(random, siswa), 'soal': pilih(random, soal)})
+            elif langkah == 4:
+                db.session.execute('DELETE FROM jawaban WHERE id = :id', {'id': pilih(random, jawaban)})
+            elif langkah == 5:
+                db.session.execute('UPDATE hasil_manual SET status = :status WHERE id = :id',
+                                   {'id': pilih(random, hasil_manual), 'status': pilih(random, status)})
+            elif langkah == 6:
+                db.session.execute('UPDATE hasil_manual SET id_kelas = :kelas, id_siswa = :siswa WHERE id = :id',
+                                   {'id': pilih(random, hasil_manual), 'kelas': pilih(random, kelas),
+                                    'siswa': pilih(random, siswa)})
+            else:
+                db.session.execute('DELETE FROM hasil_manual WHERE id = :id', {'id': pilih(random, hasil_manual)})
+
+            db.session.commit()
+
+    assert_ringkasan_cocok(app)
+
+
+# The same through the routes, and the summary reads the tables
+def test_summary_follows_jawaban_routes(app, client):
+    from __init__ import Jawaban
+
+    data = [{'id_soal': id_soal, 'jawaban': 'a', 'kunci': 'a', 'analisis': analisis, 'keterangan': '',
+             'status': status, 'pertanyaan': 'Soal'}
+            for id_soal, status, analisis in ((1, 1, 'Sudah benar'), (2, 0, 'Salah konsep'), (3, 1, 'Sudah benar'))]
+
+    for id_siswa in (1, 2):
+        client.post('/jawaban/batch', json={'id_siswa': id_siswa, 'id_ujian': 9603, 'data': data})
+
+    with app.app_context():
+        id = Jawaban.query.filter_by(id_ujian=9603, id_siswa=1, id_soal=3).first().id
+
+    client.delete('/jawaban/%d' % id)
+    client.delete('/jawaban/delete-all/2/9603')
+
+    assert_ringkasan_cocok(app)
+
+    summary = client.get('/ujian/9603/summary').json
+
+    assert [(s['id_siswa'], s['jumlah'], s['benar']) for s in summary['siswa']] == [(1, 2, 1)]
+    assert [(s['id_soal'], s['jumlah'], s['benar']) for s in summary['soal']] == [(1, 1, 1), (2, 1, 0)]
+    assert summary['analisis'] == [{'analisis': 'Salah konsep', 'jumlah': 1}, {'analisis': 'Sudah benar', 'jumlah': 1}]
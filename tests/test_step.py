@@ -0,0 +1,76 @@
+import pytest
+
+
+def buat_ujian(app, id_kelas, status):
+    from __init__ import db, Ujian
+
+    with app.app_context():
+        ujian = Ujian(id_kelas, 2, 'Matematika', status, '2020-01-01', '10:00')
+        db.session.add(ujian)
+        db.session.commit()
+
+        return ujian.id
+
+
+def siswa_kelas(app, id_kelas):
+    from __init__ import Siswa
+
+    with app.app_context():
+        return [siswa.id for siswa in Siswa.query.filter_by(id_kelas=id_kelas).order_by(Siswa.id)]
+
+
+def jumlah_sesi(app, id_ujian):
+    from __init__ import SesiUjian
+
+    with app.app_context():
+        return SesiUjian.query.filter_by(id_ujian=id_ujian).count()
+
+
+# Kelas 1 has calibrated Bobot for bank soal 2
+@pytest.fixture(scope='module')
+def id_ujian(app):
+    return buat_ujian(app, 1, 1)
+
+
+def test_step_serves_and_advances(app, client, id_ujian):
+    from __init__ import Jawaban
+
+    id_siswa = siswa_kelas(app, 1)[0]
+
+    mulai = client.post('/ujian/%d/step' % id_ujian, json={'id_siswa': id_siswa}).json
+    id_soal = mulai['soal']['id']
+
+    assert mulai['sesi'] == {'id_ujian': id_ujian, 'id_siswa': id_siswa, 'jumlah': 0, 'selesai': False}
+
+    jawaban = {'id_soal': id_soal, 'jawaban': 'a', 'kunci': 'a', 'analisis': '', 'keterangan': '',
+               'status': 1, 'pertanyaan': 'Soal'}
+    lanjut = client.post('/ujian/%d/step' % id_ujian, json={'id_siswa': str(id_siswa), 'jawaban': jawaban}).json
+
+    assert lanjut['sesi']['jumlah'] == 1
+    assert lanjut['soal']['id'] != id_soal
+
+    with app.app_context():
+        assert [row.id_soal for row in Jawaban.query.filter_by(id_siswa=id_siswa, id_ujian=id_ujian)] == [id_soal]
+
+
+@pytest.mark.parametrize('body', [{}, {'id_siswa': 'abc'}, {'id_siswa': 1.5}, {'id_siswa': None}, [1], 'abc'])
+def test_step_rejects_a_missing_or_bad_id_siswa(app, client, id_ujian, body):
+    jumlah = jumlah_sesi(app, id_ujian)
+
+    response = client.post('/ujian/%d/step' % id_ujian, json=body)
+
+    assert response.status_code == 400
+    assert jumlah_sesi(app, id_ujian) == jumlah
+
+
+def test_step_refuses_siswa_outside_the_ujian(app, client):
+    ujian = buat_ujian(app, 1, 1)
+    nonaktif = buat_ujian(app, 1, 0)
+    id_siswa = siswa_kelas(app, 1)[1]
+
+    assert client.post('/ujian/%d/step' % ujian, json={'id_siswa': 999999}).status_code == 404
+    assert client.post('/ujian/%d/step' % ujian, json={'id_siswa': siswa_kelas(app, 2)[0]}).status_code == 403
+    assert client.post('/ujian/%d/step' % nonaktif, json={'id_siswa': id_siswa}).status_code == 403
+    assert client.post('/ujian/999999/step', json={'id_siswa': id_siswa}).status_code == 404
+
+    assert jumlah_sesi(app, ujian) == jumlah_sesi(app, nonaktif) == 0
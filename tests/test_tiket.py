@@ -0,0 +1,102 @@
+import pytest
+from itsdangerous import URLSafeTimedSerializer
+
+
+def data_jawaban():
+    return [{'id_soal': 1, 'jawaban': 'a', 'kunci': 'a', 'analisis': '', 'keterangan': '', 'status': 1,
+             'pertanyaan': 'Soal 1'}]
+
+
+# A ticket for the first siswa of kelas 1 and ujian 1 (kelas 1, bank soal 2)
+@pytest.fixture(scope='module')
+def tiket(app):
+    from __init__ import Siswa, Token
+
+    with app.app_context():
+        token = Token.query.order_by(Token.id).first()
+        siswa = Siswa.query.filter_by(id_kelas=1).order_by(Siswa.id).first()
+        body = {'token': token.token, 'nis': siswa.nis, 'password': siswa.password, 'id_ujian': 1}
+        id_token, id_siswa = token.id, siswa.id
+
+    response = app.test_client().post('/token/%d' % id_token, json=body)
+
+    return {'tiket': response.json['tiket'], 'id_siswa': id_siswa, 'id_token': id_token, 'body': body}
+
+
+@pytest.fixture
+def wajib(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'TIKET_REQUIRED', True)
+
+
+def kirim(client, tiket, id_siswa, id_ujian=1):
+    headers = {} if tiket is None else {'X-Tiket-Ujian': tiket}
+
+    return client.post('/jawaban/batch', headers=headers,
+                       json={'id_siswa': id_siswa, 'id_ujian': id_ujian, 'data': data_jawaban()})
+
+
+def test_valid_ticket_passes(client, wajib, tiket):
+    assert kirim(client, tiket['tiket'], tiket['id_siswa']).status_code == 200
+    assert client.get('/bobot/first-soal/1/2', headers={'X-Tiket-Ujian': tiket['tiket']}).status_code == 200
+
+
+def test_missing_tampered_or_expired_ticket_is_refused(app, client, wajib, tiket, monkeypatch):
+    isi, _, tanda = tiket['tiket'].rpartition('.')
+    palsu = isi + '.' + ('A' if tanda[0] != 'A' else 'B') + tanda[1:]
+
+    # Another siswa, signed with a key that is not the server's
+    siswa_lain = URLSafeTimedSerializer('bukan-kunci-server', salt='tiket-ujian').dumps(
+        {'id_token': tiket['id_token'], 'id_siswa': tiket['id_siswa'] + 1, 'id_ujian': 1, 'id_kelas': 1,
+         'id_bank_soal': 2})
+
+    assert kirim(client, None, tiket['id_siswa']).status_code == 401
+    assert kirim(client, palsu, tiket['id_siswa']).status_code == 401
+    assert kirim(client, siswa_lain, tiket['id_siswa'] + 1).status_code == 401
+    assert kirim(client, 'bukan-tiket', tiket['id_siswa']).status_code == 401
+
+    monkeypatch.setitem(app.config, 'TIKET_MAX_AGE', -1)
+
+    assert kirim(client, tiket['tiket'], tiket['id_siswa']).status_code == 401
+
+
+# A valid ticket only covers the siswa, ujian, kelas and bank soal it was
+# issued for
+def test_ticket_of_another_siswa_or_ujian_is_forbidden(client, tiket):
+    assert kirim(client, tiket['tiket'], tiket['id_siswa'] + 1).status_code == 403
+    assert kirim(client, tiket['tiket'], tiket['id_siswa'], id_ujian=2).status_code == 403
+    assert client.get('/bobot/first-soal/2/2', headers={'X-Tiket-Ujian': tiket['tiket']}).status_code == 403
+    assert client.get('/bobot/first-soal/1/1', headers={'X-Tiket-Ujian': tiket['tiket']}).status_code == 403
+
+
+# With TIKET_REQUIRED off a bad ticket is ignored, but a valid one still
+# binds the request
+def test_tickets_are_optional_by_default(client, tiket):
+    assert kirim(client, None, tiket['id_siswa']).status_code == 200
+    assert kirim(client, 'bukan-tiket', tiket['id_siswa']).status_code == 200
+    assert kirim(client, tiket['tiket'], tiket['id_siswa'] + 1).status_code == 403
+
+
+def test_no_ticket_for_a_wrong_password_or_another_kelas(app, client, tiket):
+    from __init__ import Siswa
+
+    body = dict(tiket['body'], password='salah')
+
+    assert client.post('/token/%d' % tiket['id_token'], json=body).status_code == 401
+
+    with app.app_context():
+        siswa = Siswa.query.filter_by(id_kelas=2).first()
+        body = dict(tiket['body'], nis=siswa.nis, password=siswa.password)
+
+    response = client.post('/token/%d' % tiket['id_token'], json=body)
+
+    assert response.status_code == 403
+    assert 'tiket' not in response.json
+
+
+# The exam step takes id_siswa from the ticket
+def test_step_uses_the_siswa_of_the_ticket(client, wajib, tiket):
+    response = client.post('/ujian/1/step', headers={'X-Tiket-Ujian': tiket['tiket']}, json={})
+
+    assert response.status_code == 200
+    assert response.json['sesi']['id_siswa'] == tiket['id_siswa']
+    assert client.post('/ujian/1/step', json={'id_siswa': tiket['id_siswa']}).status_code == 401